@@ -1,5 +1,10 @@
 from cooperative_net import *
 from live_dvs_reader import *
+from replay_reader import *
+from stereo_sync import *
 from retina import *
 from simulation import *
 from ext_input import *
+from batch import *
+from partition import *
+from pixel_spike_times import *
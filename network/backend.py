@@ -0,0 +1,107 @@
+import importlib
+
+# The simulator backends which can be used by SNNSimulation, Retina and CooperativeNetwork. The backend is
+# selected at runtime (e.g. SNNSimulation(backend='cpu')) and its modules are imported only when they are first
+# used, so that importing the network package (e.g. for the analysis of results) never touches a simulator.
+# Each backend consists of a PyNN (0.7) compatible simulator module and optionally a module with the external
+# devices (e.g. the SpikeInjector) which are needed for the live input. Backends with spike_padding require at least
+# one spike for each neuron of a SpikeSourceArray (see Retina). Further PyNN implementations can be added with
+# register_backend, if they accept the conventions of sPyNNaker which the network uses (positive weights of the
+# inhibitory projections, the setup parameters of SNNSimulation).
+_BACKENDS = {'spinnaker': {'simulator': 'spynnaker.pyNN',
+                           'external_devices': 'spynnaker_external_devices_plugin.pyNN',
+                           'spike_padding': True},
+             'cpu': {'simulator': '.cpu_simulator',
+                     'external_devices': None,
+                     'spike_padding': False}}
+
+_active = {'name': 'spinnaker', 'modules': dict()}
+# the backends which have been warned about that they keep their recordings (see clear_recordings)
+_warned_clear = set()
+
+
+def _import_backend(module_name):
+    # the local backends (with a leading dot) live next to this module, which is either imported as part of the
+    # network package or with the network directory on the path (as main.py does)
+    package = __name__.rpartition('.')[0]
+    if module_name.startswith('.'):
+        if package:
+            return importlib.import_module(module_name, package)
+        module_name = module_name[1:]
+    return importlib.import_module(module_name)
+
+
+def register_backend(name, simulator, external_devices=None, spike_padding=True):
+    """registers a backend under the given name. simulator and external_devices are module names, which are
+    imported when the backend is first used (a leading dot refers to a module of the network package)."""
+    _BACKENDS[name] = {'simulator': simulator,
+                       'external_devices': external_devices,
+                       'spike_padding': spike_padding}
+    if name == _active['name']:
+        _active['modules'] = dict()
+
+
+def available_backends():
+    return sorted(_BACKENDS.keys())
+
+
+def use_backend(name):
+    assert name in _BACKENDS, "ERROR: Unknown simulator backend {0}. Choose one of {1}.".format(name,
+                                                                                            available_backends())
+    if name != _active['name']:
+        _active['name'] = name
+        _active['modules'] = dict()
+
+
+def get_backend_name():
+    return _active['name']
+
+
+def requires_spike_padding():
+    return _BACKENDS[_active['name']]['spike_padding']
+
+
+def _get_module(kind):
+    if kind not in _active['modules']:
+        module_name = _BACKENDS[_active['name']][kind]
+        assert module_name is not None, \
+            "ERROR: The simulator backend {0} does not provide {1}.".format(_active['name'], kind.replace('_', ' '))
+        _active['modules'][kind] = _import_backend(module_name)
+    return _active['modules'][kind]
+
+
+def clear_recordings():
+    """drops the spikes and voltages which have been recorded so far, if the backend supports so (the cpu backend
+    does), and returns whether it did. The other backends keep them, so that their recordings keep growing and
+    all of them are read again by each CooperativeNetwork.drain_spikes. This is warned about once per backend."""
+    module = _get_module('simulator')
+    if hasattr(module, 'clear_recordings'):
+        module.clear_recordings()
+        return True
+    if _active['name'] not in _warned_clear:
+        _warned_clear.add(_active['name'])
+        print("WARNING: The simulator backend {0} can not drop its recordings. The memory use and the time to read "
+              "the spikes of a segmented run grow with its length.".format(_active['name']))
+    return False
+
+
+def get_backend():
+    return _get_module('simulator')
+
+
+def get_external_devices():
+    return _get_module('external_devices')
+
+
+class _ModuleProxy(object):
+    """forwards attribute access to a module of the active backend, e.g. simulator.Population"""
+
+    def __init__(self, kind):
+        self._kind = kind
+
+    def __getattr__(self, item):
+        return getattr(_get_module(self._kind), item)
+
+
+simulator = _ModuleProxy('simulator')
+external_devices = _ModuleProxy('external_devices')
@@ -0,0 +1,54 @@
+from simulation import SNNSimulation
+from retina import Retina
+from cooperative_net import CooperativeNetwork
+
+
+class BatchedSimulation(object):
+    """
+    Runs several input recordings through one cooperative network in a single pass of the cpu backend.
+    The network and its connectivity are built only once and the state of all neurons has a leading batch
+    dimension, so the cost per stimulus is mostly the vectorised update of the neurons.
+    Each stimulus is either an ExternalInputReader or a (left, right) tuple of per pixel spike times (PixelSpikeTimes
+    or nested lists indexed as spike_times[x][y]), as they are given to the Retina.
+    """
+
+    def __init__(self, stimuli, dim_x=1, dim_y=1, max_disparity=0, simulation_time=1000, simulation_time_step=0.2,
+                 cell_params=None, experiment_name="Batch", connectivity_cache_dir=None, verbose=False):
+        assert len(stimuli) > 0, "ERROR: No stimuli given. Creating the batched simulation failed."
+        stimuli = [(s.retinaLeft, s.retinaRight) if hasattr(s, 'retinaLeft') else tuple(s) for s in stimuli]
+        self.batch_size = len(stimuli)
+        self.experiment_name = experiment_name
+
+        self.simulation = SNNSimulation(simulation_time=simulation_time,
+                                        simulation_time_step=simulation_time_step,
+                                        backend='cpu',
+                                        batch_size=self.batch_size)
+
+        # the retinas are created with the spike times of the first stimulus and then each pixel column gets the
+        # spike times of all stimuli
+        retinae = dict()
+        for side, label, k in (('left', "RetL", 0), ('right', "RetR", 1)):
+            retinae[side] = Retina(label=label, dimension_x=dim_x, dimension_y=dim_y,
+                                   spike_times=stimuli[0][k], experiment_name=experiment_name,
+                                   verbose=verbose)
+            for x, column in enumerate(retinae[side].pixel_columns):
+                column.set_batch('spike_times', [s[k][x] for s in stimuli])
+
+        # the packed layout keeps the number of populations and projections independent of the network size
+        self.network = CooperativeNetwork(retinae=retinae, max_disparity=max_disparity, cell_params=cell_params,
+                                          experiment_name=experiment_name, packed_layout=True,
+                                          connectivity_cache_dir=connectivity_cache_dir, verbose=verbose)
+        self.retinae = retinae
+
+    def run(self):
+        """runs all stimuli and returns a list with the decoded collector spikes of each of them (see
+        CooperativeNetwork.decode_spikes)."""
+        self.simulation.run()
+        return [self.get_spikes(b) for b in range(0, self.batch_size)]
+
+    def get_spikes(self, batch=0, sort_by_time=True):
+        return self.network.decode_spikes([x[1].getSpikes(batch=batch) for x in self.network.network],
+                                          sort_by_time=sort_by_time)
+
+    def end(self):
+        self.simulation.end()
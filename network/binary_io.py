@@ -0,0 +1,61 @@
+import numpy as np
+import json
+import os
+
+# The binary output format consists of two files which share the same base name:
+# <name>.bin holds the raw records of a structured array (fixed-width columns, little-endian, no header) and
+# <name>.json is a sidecar with the record layout, the number of records and any additional meta information
+# (e.g. the experiment preamble). The records can therefore be memory-mapped without parsing anything.
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def write_binary(path, records, meta=None):
+    records = np.ascontiguousarray(records, dtype=records.dtype.newbyteorder('<'))
+    with open(path, 'wb') as fb:
+        records.tofile(fb)
+    header = {'dtype': records.dtype.descr,
+              'count': int(records.size),
+              'meta': meta if meta is not None else {}}
+    with open(sidecar_path(path), 'w') as fj:
+        json.dump(header, fj, indent=1)
+
+
+def append_binary(path, records, meta=None):
+    """appends records to a binary file (e.g. the spikes of each slice of a segmented run), creating it if
+    needed. The meta information of the sidecar is kept from the first call unless meta is given."""
+    if not os.path.exists(path) or not os.path.exists(sidecar_path(path)):
+        write_binary(path, records, meta)
+        return
+    header = read_header(path)
+    records = np.ascontiguousarray(records, dtype=records.dtype.newbyteorder('<'))
+    assert records.dtype == header['dtype'], "ERROR: The records do not match the layout of {0}.".format(path)
+    with open(path, 'ab') as fb:
+        records.tofile(fb)
+    header = {'dtype': header['dtype'].descr,
+              'count': header['count'] + int(records.size),
+              'meta': meta if meta is not None else header['meta']}
+    # replace the sidecar atomically, such that readers never see a partial one
+    tmp_file = "{0}.{1}.tmp".format(sidecar_path(path), os.getpid())
+    with open(tmp_file, 'w') as fj:
+        json.dump(header, fj, indent=1)
+    os.rename(tmp_file, sidecar_path(path))
+
+
+def read_header(path):
+    with open(sidecar_path(path), 'r') as fj:
+        header = json.load(fj)
+    # json returns lists (and unicode strings in python 2) which numpy does not accept as a dtype description
+    header['dtype'] = np.dtype([(str(name), str(fmt)) for name, fmt in header['dtype']])
+    return header
+
+
+def read_binary(path, mode='r'):
+    """returns a memory-mapped structured array of the records and the meta information from the sidecar."""
+    header = read_header(path)
+    if header['count'] == 0:
+        return np.zeros(0, dtype=header['dtype']), header['meta']
+    records = np.memmap(path, dtype=header['dtype'], mode=mode, shape=(header['count'],))
+    return records, header['meta']
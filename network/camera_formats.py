@@ -0,0 +1,194 @@
+import numpy as np
+import os
+
+# Decoders for the recordings of event cameras, which are read without converting them to the .dat text format:
+#   .aedat  AEDAT 2.0 (jAER): a header of lines starting with "#" (up to "#End Of ASCII Header"), followed by
+#           big-endian pairs of 32 bit words (address, timestamp in us). The address of the DVS128 holds the
+#           polarity in bit 0 (0 is ON), the mirrored x in the bits 1-7 and y in the bits 8-14, which are decoded as
+#           the DVS128 extractor of jAER does (x = 127 - address x). Stereo recordings tag the events of the second
+#           retina with bit 15. The 32 bit timestamps wrap around after about 71 minutes.
+#   .aedat  AEDAT 3.1 (cAER): a header of lines starting with "#!" up to "#!END-HEADER", followed by packets with
+#           a 28 byte header (little-endian) and the events. Only the polarity events (type 1) are decoded, whose
+#           first word holds the valid bit (0), the polarity (1), y (bits 2-16) and x (bits 17-31) and the second
+#           one the timestamp in us, which is extended by the timestamp overflow counter of the packet. The packets
+#           of different sources (e.g. the two cameras of a stereo setup) overlap in time, so each source is decoded
+#           as a stream of its own (see camera_streams).
+#   .raw    EVT 2.0 (Prophesee): a header of lines starting with "%", followed by little-endian 32 bit words with
+#           the type in the upper 4 bits. CD events (type 0 OFF, 1 ON) hold the lower 6 bits of the timestamp in
+#           the bits 22-27, x in the bits 11-21 and y in the bits 0-10, EVT_TIME_HIGH words (type 8) the upper 28
+#           bits of the timestamp. All other word types are skipped.
+# The decoders turn the raw words into (N, 5) int64 arrays of (t, x, y, p, retina) rows with np.frombuffer and
+# vectorised bit operations. As in the .dat recordings, the pixel coordinates start at 1.
+
+CAMERA_EXTENSIONS = (".aedat", ".raw")
+
+# the version of the decoders, which is part of the keys of the cached inputs (see ExternalInputReader). Version 2
+# decodes AEDAT 2.0 as jAER does.
+CAMERA_DECODER_VERSION = 2
+
+# the width of the DVS128 sensor, whose x addresses are mirrored in AEDAT 2.0 recordings
+DVS128_WIDTH = 128
+
+_AEDAT3_PACKET_HEADER = np.dtype([('type', '<i2'), ('source', '<i2'), ('size', '<i4'), ('ts_offset', '<i4'),
+                                  ('ts_overflow', '<i4'), ('capacity', '<i4'), ('number', '<i4'), ('valid', '<i4')])
+_AEDAT3_POLARITY_EVENT = 1
+
+_EVT2_CD_OFF = 0x0
+_EVT2_CD_ON = 0x1
+_EVT2_TIME_HIGH = 0x8
+
+
+def _as_bytes(data):
+    return np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8)
+
+
+def split_header(data, prefix, end_line=None):
+    """returns the header lines of a recording (which start with prefix) and the offset at which the events begin.
+    With end_line the header ends after this line, even if the following data happens to start with the prefix."""
+    data = _as_bytes(data)
+    lines, offset = [], 0
+    while offset < len(data) and data[offset:offset + len(prefix)].tostring() == prefix:
+        newline = np.flatnonzero(data[offset:offset + (1 << 16)] == ord("\n"))
+        assert len(newline), "ERROR: Unterminated header line in the recording."
+        line = data[offset:offset + newline[0] + 1].tostring()
+        lines.append(line.rstrip("\r\n"))
+        offset += newline[0] + 1
+        if end_line is not None and line.startswith(end_line):
+            break
+    return lines, offset
+
+
+def _events(t, x, y, p, retina):
+    return np.column_stack((t.astype(np.int64), x.astype(np.int64) + 1, y.astype(np.int64) + 1,
+                            p.astype(np.int64), np.broadcast_to(np.asarray(retina, dtype=np.int64), t.shape)))
+
+
+def _unwrap_timestamps(t, last, bits):
+    """continues the timestamps t of a counter of the given bits after last (the unwrapped timestamp before t, or
+    None), counting a wrap around whenever a timestamp is more than half of the counter range smaller than its
+    predecessor (so that slightly unsorted timestamps are kept). Returns the unwrapped timestamps."""
+    t = t.astype(np.int64)
+    if len(t) == 0:
+        return t
+    previous = t[0] if last is None else last & ((1 << bits) - 1)
+    wrapped = np.diff(np.r_[previous, t]) < -(1 << (bits - 1))
+    return t + ((0 if last is None else last >> bits) + np.cumsum(wrapped) << bits)
+
+
+def aedat2_blocks(data, block_rows=1 << 16, retina_bit=15, flip_x=True):
+    """decodes the events of an AEDAT 2.0 recording in blocks of at most block_rows events. With flip_x the x
+    addresses are mirrored as by jAER, which has to be the same for both retinas of a stereo recording."""
+    data = _as_bytes(data)
+    _, offset = split_header(data, b"#", end_line=b"#End Of ASCII Header")
+    n_events = (len(data) - offset) // 8
+    words = np.frombuffer(data[offset:offset + n_events * 8], dtype='>u4').reshape(-1, 2)
+    last = None
+    for i in range(0, n_events, block_rows):
+        address, t = words[i:i + block_rows, 0], words[i:i + block_rows, 1]
+        t = _unwrap_timestamps(t, last, 32)
+        last = t[-1]
+        retina = (address >> retina_bit) & 1 if retina_bit is not None else 0
+        x = (address >> 1) & 0x7f
+        if flip_x:
+            x = DVS128_WIDTH - 1 - x
+        yield _events(t, x, (address >> 8) & 0x7f, 1 - (address & 1), retina)
+
+
+def aedat3_sources(data):
+    """the sorted source IDs of the polarity event packets of an AEDAT 3.1 recording (only the packet headers are
+    read)."""
+    data = _as_bytes(data)
+    _, offset = split_header(data, b"#", end_line=b"#!END-HEADER")
+    size = _AEDAT3_PACKET_HEADER.itemsize
+    sources = set()
+    while offset + size <= len(data):
+        packet = np.frombuffer(data[offset:offset + size], dtype=_AEDAT3_PACKET_HEADER)[0]
+        offset += size + int(packet['capacity']) * int(packet['size'])
+        if packet['type'] == _AEDAT3_POLARITY_EVENT and int(packet['number']) > 0:
+            sources.add(int(packet['source']))
+    return sorted(sources)
+
+
+def aedat3_blocks(data, block_rows=1 << 16, source_retinas=None, sources=None):
+    """decodes the polarity events of an AEDAT 3.1 recording packet by packet. source_retinas maps the event
+    source IDs to the retina IDs (e.g. {1: 0, 2: 1} for a stereo setup), by default all events belong to retina 0.
+    The events of other sources, or of the ones not in sources (if given), are skipped. Only the blocks of a single
+    source are sorted by time."""
+    data = _as_bytes(data)
+    header, offset = split_header(data, b"#", end_line=b"#!END-HEADER")
+    assert header and header[0].startswith(b"#!AER-DAT3"), "ERROR: The recording is not in the AEDAT 3 format."
+    size = _AEDAT3_PACKET_HEADER.itemsize
+    while offset + size <= len(data):
+        packet = np.frombuffer(data[offset:offset + size], dtype=_AEDAT3_PACKET_HEADER)[0]
+        begin, offset = offset + size, offset + size + int(packet['capacity']) * int(packet['size'])
+        if packet['type'] != _AEDAT3_POLARITY_EVENT or int(packet['number']) == 0:
+            continue
+        if sources is not None and int(packet['source']) not in sources:
+            continue
+        if source_retinas is None:
+            retina = 0
+        elif int(packet['source']) in source_retinas:
+            retina = source_retinas[int(packet['source'])]
+        else:
+            continue
+        # the events are (data, timestamp) pairs, possibly followed by further fields
+        words = np.frombuffer(data[begin:begin + int(packet['number']) * int(packet['size'])], dtype='<u4')
+        words = words.reshape(int(packet['number']), int(packet['size']) // 4)
+        words = words[(words[:, 0] & 1) == 1]
+        t = (np.int64(packet['ts_overflow']) << 31) | words[:, 1].astype(np.int64)
+        for i in range(0, len(words), block_rows):
+            w, block_t = words[i:i + block_rows, 0], t[i:i + block_rows]
+            yield _events(block_t, (w >> 17) & 0x7fff, (w >> 2) & 0x7fff, (w >> 1) & 1, retina)
+
+
+def evt2_blocks(data, block_rows=1 << 16, retina=0):
+    """decodes the CD events of an EVT 2.0 recording in blocks of at most block_rows words. The timestamp of a CD
+    event is completed by the last EVT_TIME_HIGH word before it, which is carried over from block to block."""
+    data = _as_bytes(data)
+    _, offset = split_header(data, b"%")
+    n_words = (len(data) - offset) // 4
+    words = np.frombuffer(data[offset:offset + n_words * 4], dtype='<u4')
+    time_high = np.int64(0)
+    for i in range(0, n_words, block_rows):
+        block = words[i:i + block_rows]
+        kind = block >> 28
+        is_high = kind == _EVT2_TIME_HIGH
+        # the upper timestamp bits of each word are those of the last EVT_TIME_HIGH word up to it. The counter of
+        # 28 bits wraps around after about 4.8 hours, which is detected by a decreasing value.
+        high = (block[is_high] & 0x0fffffff).astype(np.int64)
+        wrapped = np.diff(np.r_[time_high & 0x0fffffff, high]) < 0
+        high += ((time_high >> 28) + np.cumsum(wrapped)) << 28
+        high = np.r_[time_high, high]
+        upper = high[np.cumsum(is_high)]
+        time_high = high[-1]
+        is_cd = (kind == _EVT2_CD_OFF) | (kind == _EVT2_CD_ON)
+        w = block[is_cd]
+        t = (upper[is_cd] << 6) | ((w >> 22) & 0x3f).astype(np.int64)
+        yield _events(t, (w >> 11) & 0x7ff, w & 0x7ff, kind[is_cd], retina)
+
+
+def camera_streams(file_path, block_rows=1 << 16, **decoder_params):
+    """decodes a camera recording (see CAMERA_EXTENSIONS) block by block. Returns a list of block iterators, each
+    of which is sorted by time: one for each source of an AEDAT 3.1 recording (which are to be merged by time, see
+    event_io.iter_events), a single one for the other formats. The file is memory-mapped, so only the decoded
+    blocks are held in memory. The format of .aedat files is given by the version in their first line."""
+    data = np.memmap(file_path, dtype=np.uint8, mode='r') if os.path.getsize(file_path) else np.zeros(0, np.uint8)
+    if file_path.endswith(".raw"):
+        header, _ = split_header(data, b"%")
+        assert not any(line.lower().startswith(b"% evt ") and b"2.0" not in line for line in header), \
+            "ERROR: Only the EVT 2.0 format of raw recordings is supported."
+        return [evt2_blocks(data, block_rows, **decoder_params)]
+    if data[:12].tostring() == b"#!AER-DAT3.1":
+        source_retinas = decoder_params.get('source_retinas')
+        sources = sorted(source_retinas) if source_retinas is not None else aedat3_sources(data)
+        return [aedat3_blocks(data, block_rows, sources=[source], **decoder_params) for source in sources]
+    assert data[:12].tostring() != b"#!AER-DAT3.0" and data[:10].tostring() != b"#!AER-DAT4", \
+        "ERROR: Only the AEDAT 2.0 and 3.1 formats are supported."
+    return [aedat2_blocks(data, block_rows, **decoder_params)]
+
+
+def read_camera(file_path, **decoder_params):
+    """decodes all events of a camera recording, sorted by time."""
+    blocks = [block for stream in camera_streams(file_path, **decoder_params) for block in stream]
+    events = np.concatenate(blocks) if blocks else np.zeros((0, 5), dtype=np.int64)
+    return events[np.argsort(events[:, 0], kind='mergesort')]
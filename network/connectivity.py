@@ -0,0 +1,191 @@
+import numpy as np
+import hashlib
+import json
+import os
+
+# every projection class of the cooperative network is stored as an array of (pre, post, weight, delay) edges
+EDGE_DTYPE = np.dtype([('pre', np.int64), ('post', np.int64), ('weight', np.float64), ('delay', np.float64)])
+
+
+def _edges(pre, post, weight, delay):
+    pre, post = np.ravel(pre), np.ravel(post)
+    edges = np.empty(pre.size, dtype=EDGE_DTYPE)
+    edges['pre'] = pre
+    edges['post'] = post
+    edges['weight'] = weight
+    edges['delay'] = delay
+    return edges
+
+
+def _ragged_arange(lengths):
+    """concatenation of arange(l) for each l in lengths."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum(), dtype=np.int64) - np.repeat(starts, lengths)
+
+
+def _pairs_within_groups(keys, n_groups):
+    """all ordered pairs (i, j), i != j, of elements which have the same key."""
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.argsort(keys, kind='mergesort')
+    sizes = np.bincount(keys, minlength=n_groups)
+    offsets = np.cumsum(sizes) - sizes
+    sorted_keys = keys[order]
+    group_sizes = sizes[sorted_keys]
+    pre = np.repeat(order, group_sizes)
+    post = order[np.repeat(offsets[sorted_keys], group_sizes) + _ragged_arange(group_sizes)]
+    different = pre != post
+    return pre[different], post[different]
+
+
+def _expand(pre_ensembles, post_ensembles, pre_neurons, post_neurons, pre_size, post_size):
+    """expands pairs of microensembles into neuron ids of the packed layout, connecting pre_neurons[i] of the pre
+    microensemble with post_neurons[i] of the post microensemble (see CooperativeNetwork.packed_layout)."""
+    pre = np.asarray(pre_ensembles, dtype=np.int64)[:, None] * pre_size + np.asarray(pre_neurons)[None, :]
+    post = np.asarray(post_ensembles, dtype=np.int64)[:, None] * post_size + np.asarray(post_neurons)[None, :]
+    return pre, post
+
+
+class Connectivity(object):
+    """
+    Generates the connectivity of a cooperative network with NumPy and optionally caches it on disk.
+    The edges are keyed by projection class:
+        BC          blocker -> collector within each microensemble
+        CCi         collector -> collector inhibition along the projective lines of the pixels
+        CCe         collector -> collector excitation between neighbours of the same disparity
+        CCe_y       collector -> collector excitation along the y-axis within each microensemble
+        SC, SaB, SzB  retina -> collector, retina -> own blocker and retina -> other blocker (suffix _left/_right)
+    In the default layout CCi and CCe connect microensemble ids (one to one between the populations) and all other
+    classes connect neuron ids within a single microensemble, while SC is one to one.
+    In the packed layout all classes connect neuron ids of the packed populations, CCe includes CCe_y and the
+    retina classes are sorted by pixel column, with the edges of pixel x in [offsets[x], offsets[x + 1])
+    (see retina_edges).
+    """
+
+    def __init__(self, ensemble_index=None, dim_y=1, cell_params=None, packed_layout=False,
+                 cache_dir=None, verbose=False):
+        self.ensemble_index = ensemble_index
+        self.dim_y = dim_y
+        self.cell_params = cell_params
+        self.packed_layout = packed_layout
+
+        cache_file = None
+        if cache_dir is not None:
+            cache_file = os.path.join(cache_dir, "connectivity_{0}.npz".format(self._cache_key()))
+
+        if cache_file is not None and os.path.exists(cache_file):
+            if verbose:
+                print("INFO: Loading connectivity from cache {0}.".format(cache_file))
+            with np.load(cache_file) as f:
+                self.edges = dict((k, f[k]) for k in f.files)
+        else:
+            self.edges = self._generate()
+            if cache_file is not None:
+                if not os.path.exists(cache_dir):
+                    os.makedirs(cache_dir)
+                # write to a temporary file first so that concurrent runs never see a partial cache entry
+                tmp_file = "{0}.{1}.tmp".format(cache_file, os.getpid())
+                with open(tmp_file, 'wb') as f:
+                    np.savez(f, **self.edges)
+                os.rename(tmp_file, cache_file)
+
+    def _cache_key(self):
+        index = self.ensemble_index
+        key = {'dim_x': index.dim_x,
+               'dim_y': self.dim_y,
+               'min_d': index.min_disparity,
+               'max_d': index.max_disparity,
+               'radius_e': self.cell_params['topological']['radius_e'],
+               'radius_i': self.cell_params['topological']['radius_i'],
+               'synaptic': self.cell_params['synaptic'],
+               'packed_layout': self.packed_layout,
+               # the set of instantiated microensembles
+               'ensembles': hashlib.sha1(np.ascontiguousarray(
+                   np.column_stack((index.x_left, index.disparity)), dtype=np.int64).tobytes()).hexdigest()}
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def __getitem__(self, projection_class):
+        return self.edges[projection_class]
+
+    def retina_edges(self, projection_class, pixel):
+        """the edges of a retina projection class (packed layout only) originating from the given pixel column."""
+        offsets = self.edges[projection_class + "_offsets"]
+        return self.edges[projection_class][offsets[pixel]:offsets[pixel + 1]]
+
+    def _ensemble_pairs(self):
+        """the inhibitory and excitatory pairs (pre, post) of microensembles."""
+        index = self.ensemble_index
+        # inhibition between all microensembles on the same projective line of a left or of a right pixel column
+        pre_l, post_l = _pairs_within_groups(index.x_left, index.dim_x)
+        pre_r, post_r = _pairs_within_groups(index.x_right, index.dim_x)
+        inhibitory = (np.concatenate((pre_l, pre_r)), np.concatenate((post_l, post_r)))
+
+        # excitation between microensembles of the same disparity which are at most radius_e pixels apart
+        pre, post = [], []
+        for nb in range(1, self.cell_params['topological']['radius_e'] + 1):
+            for neighbour_x in (index.x_left + nb, index.x_left - nb):
+                valid = (neighbour_x >= 0) & (neighbour_x < index.dim_x)
+                neighbours = index.ensemble_id(neighbour_x[valid], index.disparity[valid])
+                pre.append(np.arange(index.size)[valid][neighbours >= 0])
+                post.append(neighbours[neighbours >= 0])
+        excitatory = (np.concatenate(pre), np.concatenate(post))
+        return inhibitory, excitatory
+
+    def _generate(self):
+        synaptic = self.cell_params['synaptic']
+        dim_y = self.dim_y
+        y = np.arange(dim_y, dtype=np.int64)
+        edges = dict()
+
+        # y-axis excitation within each microensemble
+        pre_y, post_y = [], []
+        for e in range(1, self.cell_params['topological']['radius_e'] + 1):
+            pre_y.extend([y[:-e], y[e:]])
+            post_y.extend([y[e:], y[:-e]])
+        pre_y, post_y = np.concatenate(pre_y), np.concatenate(post_y)
+
+        (pre_i, post_i), (pre_e, post_e) = self._ensemble_pairs()
+
+        if not self.packed_layout:
+            # the left blockers are 0..dim_y-1, the right ones dim_y..2*dim_y-1
+            edges['BC'] = np.concatenate((_edges(y, y, synaptic['wBC'], synaptic['dBC']),
+                                          _edges(y + dim_y, y, synaptic['wBC'], synaptic['dBC'])))
+            edges['CCi'] = _edges(pre_i, post_i, synaptic['wCCi'], synaptic['dCCi'])
+            edges['CCe'] = _edges(pre_e, post_e, synaptic['wCCe'], synaptic['dCCe'])
+            edges['CCe_y'] = _edges(pre_y, post_y, synaptic['wCCe'], synaptic['dCCe'])
+            edges['SaB_left'] = _edges(y, y, synaptic['wSaB'], synaptic['dSaB'])
+            edges['SzB_left'] = _edges(y, y + dim_y, synaptic['wSzB'], synaptic['dSzB'])
+            edges['SaB_right'] = _edges(y, y + dim_y, synaptic['wSaB'], synaptic['dSaB'])
+            edges['SzB_right'] = _edges(y, y, synaptic['wSzB'], synaptic['dSzB'])
+            return edges
+
+        index = self.ensemble_index
+        all_ensembles = np.arange(index.size)
+        edges['BC'] = np.concatenate(
+            (_edges(*_expand(all_ensembles, all_ensembles, y, y, 2 * dim_y, dim_y) +
+                    (synaptic['wBC'], synaptic['dBC'])),
+             _edges(*_expand(all_ensembles, all_ensembles, y + dim_y, y, 2 * dim_y, dim_y) +
+                    (synaptic['wBC'], synaptic['dBC']))))
+        edges['CCi'] = _edges(*_expand(pre_i, post_i, y, y, dim_y, dim_y) + (synaptic['wCCi'], synaptic['dCCi']))
+        edges['CCe'] = np.concatenate(
+            (_edges(*_expand(pre_e, post_e, y, y, dim_y, dim_y) + (synaptic['wCCe'], synaptic['dCCe'])),
+             _edges(*_expand(all_ensembles, all_ensembles, pre_y, post_y, dim_y, dim_y) +
+                    (synaptic['wCCe'], synaptic['dCCe']))))
+
+        # each retina pixel column connects to the microensembles on its projective line. The blocker on the same
+        # side is excited, the one on the other side is inhibited.
+        for side, pixels, own, other in (('left', index.x_left, y, y + dim_y),
+                                         ('right', index.x_right, y + dim_y, y)):
+            order = np.argsort(pixels, kind='mergesort')
+            offsets = np.zeros(index.dim_x + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(np.bincount(pixels, minlength=index.dim_x)) * dim_y
+            sources = np.tile(y, (order.size, 1))
+            edges['SC_' + side] = _edges(sources, _expand(order, order, y, y, dim_y, dim_y)[1],
+                                         synaptic['wSC'], synaptic['dSC'])
+            edges['SaB_' + side] = _edges(sources, _expand(order, order, own, own, 2 * dim_y, 2 * dim_y)[1],
+                                          synaptic['wSaB'], synaptic['dSaB'])
+            edges['SzB_' + side] = _edges(sources, _expand(order, order, other, other, 2 * dim_y, 2 * dim_y)[1],
+                                          synaptic['wSzB'], synaptic['dSzB'])
+            for projection_class in ('SC_', 'SaB_', 'SzB_'):
+                edges[projection_class + side + "_offsets"] = offsets
+        return edges
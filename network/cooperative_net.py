@@ -1,29 +1,66 @@
-import spynnaker.pyNN as ps
+from backend import simulator as ps, clear_recordings
 import numpy as np
 import time
 import os
 
+from ensemble_index import EnsembleIndex
+from binary_io import write_binary
+from connectivity import Connectivity
+
+# layout of the decoded collector spikes as returned by CooperativeNetwork.get_spikes
+SPIKES_DTYPE = np.dtype([('t', np.float64), ('x', np.int32), ('y', np.int32), ('disparity', np.int32)])
+# layout of the membrane potential records in the binary output of CooperativeNetwork.get_v
+VOLTAGES_DTYPE = np.dtype([('tag', 'S1'), ('population', np.int32), ('neuron', np.int32),
+                           ('t', np.float64), ('v', np.float64)])
+
 
 class CooperativeNetwork(object):
 
     def __init__(self, retinae=None,
                  max_disparity=0, cell_params=None,
                  record_spikes=True, record_v=False, experiment_name="Experiment",
-                 verbose=True):
-        # IMPORTANT NOTE: This implementation assumes min_disparity = 0
+                 packed_layout=False, connectivity_cache_dir=None, verbose=True,
+                 min_disparity=0, ensemble_mask=None, pool_size=1, live_replay=None, replay_speed=1.0,
+                 timestamp_mode=0, sync_delay=None):
+        # Only the microensembles for the disparities min_disparity..max_disparity are created. The optional
+        # ensemble_mask prunes them further (see EnsembleIndex), together with all their projections.
+        # If the retinas pool pool_size x pool_size sensor pixels into one (see ExternalInputReader), the disparities
+        # of the network are in units of pool_size sensor pixels. The decoded spikes report them in sensor pixels.
+        self.pool_size = pool_size
+        # With live retinas the events are read from the two DVS cameras, or, if live_replay names a recording, the
+        # left (retina id 0) and right (retina id 1) events of the recording are replayed at replay_speed (as fast
+        # as possible with None, see ReplayReader).
+        self.live_replay = live_replay
+        self.replay_speed = replay_speed
+        # The cameras send their events with timestamps in a timestamp_mode other than 0 (see DVSReader). With a
+        # sync_delay (in seconds) the left and right events are merged by time before they are injected, waiting at
+        # most sync_delay for the other camera (see StereoSynchroniser).
+        self.timestamp_mode = timestamp_mode
+        self.sync_delay = sync_delay
+        self.synchroniser = None
+
+        # In the packed layout all blockers and all collectors are put into one Population each, instead of one
+        # Population per microensemble. Neuron i of microensemble e then has the id e * n + i in the packed
+        # Population, where n is the number of neurons of the microensemble (dim_y collectors, 2 * dim_y blockers).
+        self.packed_layout = packed_layout
 
         assert retinae['left'] is not None and retinae['right'] is not None, \
             "ERROR: Retinas are not initialised! Creating Network Failed."
 
         dx = retinae['left'].dim_x
-        assert dx > max_disparity >= 0, "ERROR: Maximum Disparity Constant is illegal!"
+        assert dx > max_disparity >= min_disparity >= 0, "ERROR: Minimum or Maximum Disparity Constant is illegal!"
         self.max_disparity = max_disparity
-        self.min_disparity = 0
-        self.size = (2 * (dx - self.min_disparity) * (self.max_disparity - self.min_disparity + 1)
-                     - (self.max_disparity - self.min_disparity + 1) ** 2
-                     + self.max_disparity - self.min_disparity + 1) / 2
+        self.min_disparity = min_disparity
+        # the ensemble index is the single source of truth for the ensemble <-> pixel/disparity mapping
+        self.ensemble_index = EnsembleIndex(dim_x=dx,
+                                            max_disparity=self.max_disparity,
+                                            min_disparity=self.min_disparity,
+                                            ensemble_mask=ensemble_mask)
+        self.size = self.ensemble_index.size
+        assert self.size > 0, "ERROR: The ensemble mask prunes all microensembles! Creating Network Failed."
         self.dim_x = dx
         self.dim_y = retinae['left'].dim_y
+        self.retinae = retinae
 
         # check this assertion before the actual network generation, since the former
         # might take very long to complete.
@@ -90,6 +127,15 @@ class CooperativeNetwork(object):
 
         self.cell_params = params if cell_params is None else cell_params
 
+        # all connectivity lists are generated at once (or loaded from the cache if the same geometry and
+        # synaptic parameters have been used before)
+        self.connectivity = Connectivity(ensemble_index=self.ensemble_index,
+                                         dim_y=self.dim_y,
+                                         cell_params=self.cell_params,
+                                         packed_layout=self.packed_layout,
+                                         cache_dir=connectivity_cache_dir,
+                                         verbose=verbose)
+
         self.network = self._create_network(record_spikes=record_spikes,
                                             record_v=record_v,
                                             verbose=verbose)
@@ -107,8 +153,9 @@ class CooperativeNetwork(object):
 
         network = []
         neural_params = self.cell_params['neural']
-        for x in range(0, self.size):
-            blocker_columns = ps.Population(self.dim_y * 2,
+        n_populations, ensembles_per_population = (1, self.size) if self.packed_layout else (self.size, 1)
+        for x in range(0, n_populations):
+            blocker_columns = ps.Population(self.dim_y * 2 * ensembles_per_population,
                                             ps.IF_curr_exp,
                                             {'tau_syn_E': neural_params['tau_E'],
                                              'tau_syn_I': neural_params['tau_I'],
@@ -116,7 +163,7 @@ class CooperativeNetwork(object):
                                              'v_reset': neural_params['v_reset_blocker']},
                                             label="Blocker {0}".format(x))
 
-            collector_column = ps.Population(self.dim_y,
+            collector_column = ps.Population(self.dim_y * ensembles_per_population,
                                              ps.IF_curr_exp,
                                              {'tau_syn_E': neural_params['tau_E'],
                                               'tau_syn_I': neural_params['tau_I'],
@@ -132,30 +179,48 @@ class CooperativeNetwork(object):
 
             network.append((blocker_columns, collector_column))
 
-        self._interconnect_neurons(network, verbose=verbose)
-        if self.dim_x > 1:
-            self._interconnect_neurons_inhexc(network, verbose)
+        if self.packed_layout:
+            self._interconnect_neurons_packed(network[0], verbose=verbose)
         else:
-            global _retina_proj_l, _retina_proj_r, same_disparity_indices
-            _retina_proj_l = [[0]]
-            _retina_proj_r = [[0]]
-            same_disparity_indices = [[0]]
-            
+            self._interconnect_neurons(network, verbose=verbose)
+            if self.dim_x > 1:
+                self._interconnect_neurons_inhexc(network, verbose)
+
         return network
 
+    def _interconnect_neurons_packed(self, ensembles, verbose=False):
+
+        assert ensembles is not None, \
+            "ERROR: Network is not initialised! Interconnecting the packed network failed."
+
+        blockers, collectors = ensembles
+        if verbose:
+            print "INFO: Interconnecting Neurons of the packed network."
+
+        # both blockers (the left ones are 0..dim_y-1, the right ones dim_y..2*dim_y-1) inhibit their collector
+        ps.Projection(blockers, collectors, ps.FromListConnector(self.connectivity['BC'].tolist()),
+                      target='inhibitory')
+
+        if self.dim_x <= 1:
+            return
+
+        # inhibition along the projective lines of each pixel column, excitation between neighbours of the same
+        # disparity and between neighbouring collectors along the y-axis
+        if verbose:
+            print "INFO: Connecting neurons for internal excitation and inhibition."
+        ps.Projection(collectors, collectors, ps.FromListConnector(self.connectivity['CCi'].tolist()),
+                      target='inhibitory')
+        ps.Projection(collectors, collectors, ps.FromListConnector(self.connectivity['CCe'].tolist()),
+                      target='excitatory')
+
     def _interconnect_neurons(self, network, verbose=False):
 
         assert network is not None, \
             "ERROR: Network is not initialised! Interconnecting failed."
 
-        synaptic_params = self.cell_params['synaptic']
-
-        # generate connectivity list: 0 untill dimensionRetinaY-1 for the left
+        # connectivity list: 0 untill dimensionRetinaY-1 for the left
         # and dimensionRetinaY till dimensionRetinaY*2 - 1 for the right
-        connList = []
-        for y in range(0, self.dim_y):
-            connList.append((y, y, synaptic_params['wBC'], synaptic_params['dBC']))
-            connList.append((y + self.dim_y, y, synaptic_params['wBC'], synaptic_params['dBC']))
+        connList = self.connectivity['BC'].tolist()
 
         # connect the inhibitory neurons to the cell output neurons
         if verbose:
@@ -173,109 +238,26 @@ class CooperativeNetwork(object):
         if verbose and 0 <= self.cell_params['topological']['radius_e'] > self.dim_x:
             print "WARNING: Bad radius of excitation. "
 
-        # create lists with inhibitory along the Retina Right projective line
-        nbhoodInhL = []
-        nbhoodInhR = []
-        nbhoodExcX = []
-        nbhoodEcxY = []
-        # used for the triangular form of the matrix in order to remain within the square
-        if verbose:
-            print "INFO: Generating inhibitory and excitatory connectivity patterns."
-        # generate rows
-        limiter = self.max_disparity - self.min_disparity + 1
-        ensembleIndex = 0
-
-        while ensembleIndex < len(network):
-            if ensembleIndex / (self.max_disparity - self.min_disparity + 1) > \
-                                    (self.dim_x - self.min_disparity) - (self.max_disparity - self.min_disparity) - 1:
-                limiter -= 1
-                if limiter == 0:
-                    break
-            nbhoodInhL.append([ensembleIndex + disp for disp in range(0, limiter)])
-            ensembleIndex += limiter
-
-        ensembleIndex = len(network)
-
-        # generate columns
-        nbhoodInhR = [[x] for x in nbhoodInhL[0]]
-        shiftGlob = 0
-        for x in nbhoodInhL[1:]:
-            shiftGlob += 1
-            shift = 0
-
-            for e in x:
-                if (shift + 1) % (self.max_disparity - self.min_disparity + 1) == 0:
-                    nbhoodInhR.append([e])
-                else:
-                    nbhoodInhR[shift + shiftGlob].append(e)
-                shift += 1
-
-        # generate all diagonals
-        for diag in map(None, *nbhoodInhL):
-            sublist = []
-            for elem in diag:
-                if elem is not None:
-                    sublist.append(elem)
-            nbhoodExcX.append(sublist)
-
-        # generate all y-axis excitation
-        for x in range(0, self.dim_y):
-            for e in range(1, self.cell_params['topological']['radius_e'] + 1):
-                if x + e < self.dim_y:
-                    nbhoodEcxY.append(
-                        (x, x + e, self.cell_params['synaptic']['wCCe'], self.cell_params['synaptic']['dCCe']))
-                if x - e >= 0:
-                    nbhoodEcxY.append(
-                        (x, x - e, self.cell_params['synaptic']['wCCe'], self.cell_params['synaptic']['dCCe']))
-
-        # Store these lists as global parameters as they can be used to quickly match the spiking collector neuron
-        # with the corresponding pixel xy coordinates (same_disparity_indices)
-        # TODO: think of a better way to encode pixels: closed form formula would be perfect
-        # These are also used when connecting the spike sources to the network! (retina_proj_l, retina_proj_r)
-
-        global _retina_proj_l, _retina_proj_r, same_disparity_indices
-
-        _retina_proj_l = nbhoodInhL
-        _retina_proj_r = nbhoodInhR
-        same_disparity_indices = nbhoodExcX
+        # the inhibitory pairs lie on the projective lines of the left and right pixel columns and the excitatory
+        # pairs are neighbouring ensembles of same disparity (see Connectivity)
+        nbhoodInh = self.connectivity['CCi']
+        nbhoodExcX = self.connectivity['CCe']
+        nbhoodEcxY = self.connectivity['CCe_y'].tolist()
 
         if verbose:
             print "INFO: Connecting neurons for internal excitation and inhibition."
 
-        for row in nbhoodInhL:
-            for pop in row:
-                for nb in row:
-                    if nb != pop:
-                        ps.Projection(network[pop][1],
-                                      network[nb][1],
-                                      ps.OneToOneConnector(weights=self.cell_params['synaptic']['wCCi'],
-                                                           delays=self.cell_params['synaptic']['dCCi']),
-                                      target='inhibitory')
-        for col in nbhoodInhR:
-            for pop in col:
-                for nb in col:
-                    if nb != pop:
-                        ps.Projection(network[pop][1],
-                                      network[nb][1],
-                                      ps.OneToOneConnector(weights=self.cell_params['synaptic']['wCCi'],
-                                                           delays=self.cell_params['synaptic']['dCCi']),
-                                      target='inhibitory')
-
-        for diag in nbhoodExcX:
-            for pop in diag:
-                for nb in range(1, self.cell_params['topological']['radius_e'] + 1):
-                    if diag.index(pop) + nb < len(diag):
-                        ps.Projection(network[pop][1],
-                                      network[diag[diag.index(pop) + nb]][1],
-                                      ps.OneToOneConnector(weights=self.cell_params['synaptic']['wCCe'],
-                                                           delays=self.cell_params['synaptic']['dCCe']),
-                                      target='excitatory')
-                    if diag.index(pop) - nb >= 0:
-                        ps.Projection(network[pop][1],
-                                      network[diag[diag.index(pop) - nb]][1],
-                                      ps.OneToOneConnector(weights=self.cell_params['synaptic']['wCCe'],
-                                                           delays=self.cell_params['synaptic']['dCCe']),
-                                      target='excitatory')
+        for pop, nb, weight, delay in nbhoodInh.tolist():
+            ps.Projection(network[pop][1],
+                          network[nb][1],
+                          ps.OneToOneConnector(weights=weight, delays=delay),
+                          target='inhibitory')
+
+        for pop, nb, weight, delay in nbhoodExcX.tolist():
+            ps.Projection(network[pop][1],
+                          network[nb][1],
+                          ps.OneToOneConnector(weights=weight, delays=delay),
+                          target='excitatory')
 
         for ensemble in network:
             ps.Projection(ensemble[1], ensemble[1], ps.FromListConnector(nbhoodEcxY), target='excitatory')
@@ -285,70 +267,58 @@ class CooperativeNetwork(object):
         if verbose:
             print "INFO: Connecting Spike Sources to Network."
 
-        global _retina_proj_l, _retina_proj_r
-
         # left is 0--dimensionRetinaY-1; right is dimensionRetinaY--dimensionRetinaY*2-1
-        connListRetLBlockerL = []
-        connListRetLBlockerR = []
-        connListRetRBlockerL = []
-        connListRetRBlockerR = []
-        for y in range(0, self.dim_y):
-            connListRetLBlockerL.append((y, y,
-                                         self.cell_params['synaptic']['wSaB'],
-                                         self.cell_params['synaptic']['dSaB']))
-            connListRetLBlockerR.append((y, y + self.dim_y,
-                                         self.cell_params['synaptic']['wSzB'],
-                                         self.cell_params['synaptic']['dSzB']))
-            connListRetRBlockerL.append((y, y,
-                                         self.cell_params['synaptic']['wSzB'],
-                                         self.cell_params['synaptic']['dSzB']))
-            connListRetRBlockerR.append((y, y + self.dim_y,
-                                         self.cell_params['synaptic']['wSaB'],
-                                         self.cell_params['synaptic']['dSaB']))
+        connListRetLBlockerL = self.connectivity['SaB_left'].tolist()
+        connListRetLBlockerR = self.connectivity['SzB_left'].tolist()
+        connListRetRBlockerL = self.connectivity['SzB_right'].tolist()
+        connListRetRBlockerR = self.connectivity['SaB_right'].tolist()
 
         retinaLeft = retinae['left'].pixel_columns
         retinaRight = retinae['right'].pixel_columns
-        pixel = 0
-        for row in _retina_proj_l:
-            for pop in row:
-                ps.Projection(retinaLeft[pixel],
-                              self.network[pop][1],
-                              ps.OneToOneConnector(weights=self.cell_params['synaptic']['wSC'],
-                                                   delays=self.cell_params['synaptic']['dSC']),
-                              target='excitatory')
-                ps.Projection(retinaLeft[pixel],
-                              self.network[pop][0],
-                              ps.FromListConnector(connListRetLBlockerL),
-                              target='excitatory')
-                ps.Projection(retinaLeft[pixel],
-                              self.network[pop][0],
-                              ps.FromListConnector(connListRetLBlockerR),
-                              target='inhibitory')
-            pixel += 1
-
-        pixel = 0
-        for col in _retina_proj_r:
-            for pop in col:
-                ps.Projection(retinaRight[pixel], self.network[pop][1],
-                              ps.OneToOneConnector(weights=self.cell_params['synaptic']['wSC'],
-                                                   delays=self.cell_params['synaptic']['dSC']),
-                              target='excitatory')
-                ps.Projection(retinaRight[pixel],
-                              self.network[pop][0],
-                              ps.FromListConnector(connListRetRBlockerR),
-                              target='excitatory')
-                ps.Projection(retinaRight[pixel],
-                              self.network[pop][0],
-                              ps.FromListConnector(connListRetRBlockerL),
-                              target='inhibitory')
-            pixel += 1
+        if self.packed_layout:
+            self._connect_spike_sources_packed(retinaLeft, retinaRight)
+        else:
+            pixel = 0
+            for row in self.ensemble_index.rows():
+                for pop in row:
+                    ps.Projection(retinaLeft[pixel],
+                                  self.network[pop][1],
+                                  ps.OneToOneConnector(weights=self.cell_params['synaptic']['wSC'],
+                                                       delays=self.cell_params['synaptic']['dSC']),
+                                  target='excitatory')
+                    ps.Projection(retinaLeft[pixel],
+                                  self.network[pop][0],
+                                  ps.FromListConnector(connListRetLBlockerL),
+                                  target='excitatory')
+                    ps.Projection(retinaLeft[pixel],
+                                  self.network[pop][0],
+                                  ps.FromListConnector(connListRetLBlockerR),
+                                  target='inhibitory')
+                pixel += 1
+
+            pixel = 0
+            for col in self.ensemble_index.columns():
+                for pop in col:
+                    ps.Projection(retinaRight[pixel], self.network[pop][1],
+                                  ps.OneToOneConnector(weights=self.cell_params['synaptic']['wSC'],
+                                                       delays=self.cell_params['synaptic']['dSC']),
+                                  target='excitatory')
+                    ps.Projection(retinaRight[pixel],
+                                  self.network[pop][0],
+                                  ps.FromListConnector(connListRetRBlockerR),
+                                  target='excitatory')
+                    ps.Projection(retinaRight[pixel],
+                                  self.network[pop][0],
+                                  ps.FromListConnector(connListRetRBlockerL),
+                                  target='inhibitory')
+                pixel += 1
 
         # configure for the live input streaming if desired
         if not(retinae['left'].use_prerecorded_input and retinae['right'].use_prerecorded_input):
             from spynnaker_external_devices_plugin.pyNN.connections.spynnaker_live_spikes_connection import \
                 SpynnakerLiveSpikesConnection
 
-            all_retina_labels = retinaLeft.labels + retinaRight.labels
+            all_retina_labels = retinae['left'].labels + retinae['right'].labels
             self.live_connection_sender = SpynnakerLiveSpikesConnection(receive_labels=None, local_port=19999,
                                                                         send_labels=all_retina_labels)
 
@@ -358,20 +328,58 @@ class CooperativeNetwork(object):
             # sets the "is_running" to False.
             self.live_connection_sender.add_start_callback(all_retina_labels[0], self.start_injecting)
 
-            import DVSReader as dvs
-            # the port numbers might well be wrong
-            self.dvs_stream_left = dvs.DVSReader(port=0,
-                                                 label=retinaLeft.label,
-                                                 live_connection=self.live_connection_sender)
-            self.dvs_stream_right = dvs.DVSReader(port=1,
-                                                  label=retinaRight.label,
-                                                  live_connection=self.live_connection_sender)
+            # the readers address the injector neurons through the same mapping as the retinas have created them
+            if self.live_replay is not None:
+                from replay_reader import ReplayReader
+                self.dvs_stream_left = ReplayReader(self.live_replay, retina=0,
+                                                    label=retinae['left'].label,
+                                                    live_connection=self.live_connection_sender,
+                                                    speed=self.replay_speed,
+                                                    mapping=retinae['left'].injector_mapping)
+                self.dvs_stream_right = ReplayReader(self.live_replay, retina=1,
+                                                     label=retinae['right'].label,
+                                                     live_connection=self.live_connection_sender,
+                                                     speed=self.replay_speed,
+                                                     mapping=retinae['right'].injector_mapping)
+            else:
+                import live_dvs_reader as dvs
+                # the port numbers might well be wrong
+                self.dvs_stream_left = dvs.DVSReader(port=0,
+                                                     label=retinae['left'].label,
+                                                     live_connection=self.live_connection_sender,
+                                                     mapping=retinae['left'].injector_mapping,
+                                                     timestamp_mode=self.timestamp_mode)
+                self.dvs_stream_right = dvs.DVSReader(port=1,
+                                                      label=retinae['right'].label,
+                                                      live_connection=self.live_connection_sender,
+                                                      mapping=retinae['right'].injector_mapping,
+                                                      timestamp_mode=self.timestamp_mode)
+            if self.sync_delay is not None:
+                from stereo_sync import StereoSynchroniser
+                self.synchroniser = StereoSynchroniser(self.dvs_stream_left, self.dvs_stream_right,
+                                                       max_delay=self.sync_delay)
 
             # start the threads, i.e. start reading from the DVS. However, nothing will be sent to the SNN.
             # See start_injecting
             self.dvs_stream_left.start()
             self.dvs_stream_right.start()
 
+    def _connect_spike_sources_packed(self, retinaLeft, retinaRight):
+        # each pixel column of a retina is connected to the collectors and to the blockers of all microensembles on
+        # its projective line. The blocker on the same side is excited, the one of the other side is inhibited.
+        blockers, collectors = self.network[0]
+        for side, retina in (('left', retinaLeft), ('right', retinaRight)):
+            for pixel in range(0, self.dim_x):
+                ps.Projection(retina[pixel], collectors,
+                              ps.FromListConnector(self.connectivity.retina_edges('SC_' + side, pixel).tolist()),
+                              target='excitatory')
+                ps.Projection(retina[pixel], blockers,
+                              ps.FromListConnector(self.connectivity.retina_edges('SaB_' + side, pixel).tolist()),
+                              target='excitatory')
+                ps.Projection(retina[pixel], blockers,
+                              ps.FromListConnector(self.connectivity.retina_edges('SzB_' + side, pixel).tolist()),
+                              target='inhibitory')
+
     def start_injecting(self):
         # start injecting into the SNN
         self.dvs_stream_left.start_injecting = True
@@ -383,64 +391,103 @@ class CooperativeNetwork(object):
                       'dim_y':self.dim_y,
                       'min_d':self.min_disparity,
                       'max_d':self.max_disparity}
+        if self.pool_size != 1:
+            parameters['pool_size'] = self.pool_size
+        if self.ensemble_index.ensemble_mask is not None:
+            parameters['ensemble_mask'] = self.ensemble_index.ensemble_mask.tolist()
         return parameters
 
-    """ this method returns (and saves) a full list of spike times
-    with the corresponding pixel location and disparities."""
-    def get_spikes(self, sort_by_time=True, save_spikes=True):
-        global same_disparity_indices, _retina_proj_l
-        spikes_per_population = [x[1].getSpikes() for x in self.network]
-        spikes = list()
-        # for each column population in the network, find the x,y coordinates corresponding to the neuron
-        # and the disparity. Then write them in the list and sort it by the timestamp value.
-        for col_index, col in enumerate(spikes_per_population, 0):  # it is 0-indexed
-            # find the disparity
-            disp = self.min_disparity
-            for d in range(0, self.max_disparity + 1):
-                if col_index in same_disparity_indices[d]:
-                    disp = d + self.min_disparity
-                    break
-            # for each spike in the population extract the timestamp and x,y coordinates
-            for spike in col:
-                x_coord = 0
-                for p in range(0, self.dim_x):
-                    if col_index in _retina_proj_l[p]:
-                        x_coord = p
-                        break
-                y_coord = int(spike[0])
-                spikes.append((round(spike[1], 1), x_coord+1, y_coord+1, disp))	# pixel coordinates are 1-indexed
-        if sort_by_time:
-            spikes.sort(key=lambda x: x[0])
+    """ this method returns (and saves) all spike times with the corresponding pixel location and disparities
+    as a structured array with the fields t, x, y, disparity (see SPIKES_DTYPE). If as_list is set, a list of
+    (t, x, y, disparity) tuples is returned instead, as in the older versions.
+    The file_format can be 'text' or 'binary' (see binary_io)."""
+    def get_spikes(self, sort_by_time=True, save_spikes=True, as_list=False, file_format='text'):
+        spikes = self.decode_spikes([x[1].getSpikes() for x in self.network], sort_by_time=sort_by_time)
         if save_spikes:
             if not os.path.exists("./spikes"):
                 os.makedirs("./spikes")
             i = 0
-            while os.path.exists("./spikes/{0}_{1}_spikes.dat".format(self.experiment_name, i)):
+            extension = "bin" if file_format == 'binary' else "dat"
+            while os.path.exists("./spikes/{0}_{1}_spikes.{2}".format(self.experiment_name, i, extension)):
                 i += 1
-            with open('./spikes/{0}_{1}_spikes.dat'.format(self.experiment_name, i), 'w') as fs:
-                self._write_preamble(fs)
-                fs.write("### DATA FORMAT ###\n"
-                        "# Description: All spikes from the Collector Neurons are recorded. The disparity is inferred "
-                        "from the Neuron ID. The disparity is calculated with the left camera as reference."
-                        "The timestamp is dependent on the simulation parameters (simulation timestep).\n"
-                        "# Each row contains: "
-                        "Time -- x-coordinate -- y-coordinate -- disparity\n"
-                        "### DATA START ###\n")
-                for s in spikes:
-                    fs.write(str(s[0]) + " " + str(s[1]) + " " + str(s[2]) + " " + str(s[3]) + "\n")
-                fs.write("### DATA END ###")
-                fs.close()
+            if file_format == 'binary':
+                write_binary('./spikes/{0}_{1}_spikes.bin'.format(self.experiment_name, i), spikes,
+                             meta={'preamble': self._preamble_data(),
+                                   'description': "All spikes from the Collector Neurons. The disparity is "
+                                                  "calculated with the left camera as reference."})
+            else:
+                with open('./spikes/{0}_{1}_spikes.dat'.format(self.experiment_name, i), 'w') as fs:
+                    self._write_preamble(fs)
+                    fs.write("### DATA FORMAT ###\n"
+                            "# Description: All spikes from the Collector Neurons are recorded. The disparity is inferred "
+                            "from the Neuron ID. The disparity is calculated with the left camera as reference."
+                            "The timestamp is dependent on the simulation parameters (simulation timestep).\n"
+                            "# Each row contains: "
+                            "Time -- x-coordinate -- y-coordinate -- disparity\n"
+                            "### DATA START ###\n")
+                    np.savetxt(fs, spikes, fmt="%.1f %d %d %d")
+                    fs.write("### DATA END ###")
+                    fs.close()
+        if as_list:
+            return spikes.tolist()
+        return spikes
+
+    def drain_spikes(self, since=0.0):
+        """returns the collector spikes from since on (see decode_spikes) and drops the recordings of the backend
+        if it supports so (see backend.clear_recordings). Only then the memory use of a segmented run does not grow
+        with its length, otherwise all spikes recorded so far are decoded again on each call."""
+        spikes = self.decode_spikes([x[1].getSpikes() for x in self.network], sort_by_time=True)
+        clear_recordings()
+        return spikes[spikes['t'] >= since]
+
+    def decode_spikes(self, spikes_per_population, sort_by_time=True):
+        """decodes the recorded collector spikes (one array of (neuron id, time) rows per collector population) into
+        a structured array of SPIKES_DTYPE."""
+        spikes_per_population = [np.asarray(x, dtype=np.float64).reshape(-1, 2) for x in spikes_per_population]
+        # each row of a population's spikes is (neuron id, time). Concatenate all populations and look up the
+        # x coordinate and the disparity from the ensemble id of each spike. Without the packed layout the
+        # ensemble id is the population id, otherwise it is encoded in the neuron id.
+        pop_ids = np.repeat(np.arange(len(spikes_per_population)), [len(x) for x in spikes_per_population])
+        all_spikes = np.concatenate(spikes_per_population) if spikes_per_population else np.zeros((0, 2))
+        neuron_ids = all_spikes[:, 0].astype(np.int64)
+        ensemble_ids = pop_ids + neuron_ids // self.dim_y
+
+        spikes = np.empty(len(all_spikes), dtype=SPIKES_DTYPE)
+        spikes['t'] = np.round(all_spikes[:, 1], 1)
+        spikes['x'] = self.ensemble_index.x_left[ensemble_ids] + 1    # pixel coordinates are 1-indexed
+        spikes['y'] = neuron_ids % self.dim_y + 1
+        spikes['disparity'] = self.ensemble_index.disparity[ensemble_ids] * self.pool_size
+        if sort_by_time:
+            spikes = spikes[np.argsort(spikes['t'], kind='mergesort')]
         return spikes
 
+    def _collector_spike_counts(self):
+        """the number of collector spikes of each microensemble."""
+        counts = np.zeros(self.size, dtype=np.int64)
+        for pop_id, ensemble in enumerate(self.network):
+            for neuron_id, count in ensemble[1].get_spike_counts().items():
+                counts[pop_id + int(neuron_id) // self.dim_y] += count
+        return counts
+
+    def _split_packed(self, recordings, neurons_per_ensemble):
+        """splits the recordings of a packed population (rows which begin with the neuron id) into one array per
+        microensemble with neuron ids relative to it, such that the result does not depend on the layout."""
+        if not self.packed_layout:
+            return recordings
+        recordings = np.asarray(recordings[0], dtype=np.float64)
+        recordings = recordings[np.argsort(recordings[:, 0], kind='mergesort')]
+        neuron_ids = recordings[:, 0].astype(np.int64)
+        recordings[:, 0] = neuron_ids % neurons_per_ensemble
+        return np.split(recordings, np.searchsorted(neuron_ids // neurons_per_ensemble, np.arange(1, self.size)))
+
     """ this method returns the accumulated spikes for each disparity as a list. It is not very useful except when
     the disparity sorting and formatting in the more general one get_spikes is not needed."""
     def get_accumulated_disparities(self, sort_by_disparity=True, save_spikes=True):
         if sort_by_disparity:
-            global same_disparity_indices
             spikes_per_disparity_map = []
-            for d in range(0, self.max_disparity - self.min_disparity + 1):
-                collector_cells = [self.network[x][1] for x in same_disparity_indices[d]]
-                spikes_per_disparity_map.append(sum([sum(x.get_spike_counts().values()) for x in collector_cells]))
+            spikes_per_ensemble = self._collector_spike_counts()
+            for d in range(self.min_disparity, self.max_disparity + 1):
+                spikes_per_disparity_map.append(int(spikes_per_ensemble[self.ensemble_index.diagonal(d)].sum()))
                 if save_spikes:
                     if not os.path.exists("./spikes"):
                         os.makedirs("./spikes")
@@ -458,36 +505,70 @@ class CooperativeNetwork(object):
             all_spikes = sum(sum(x[1].get_spikes_count().values() for x in self.network))
             return all_spikes
 
-    """ this method returns a list containing the membrane potential of all neural populations sorted by id."""
-    def get_v(self, save_v=True):
-        voltages = {"collector_v": [x[1].get_v() for x in self.network],
-                    "blockers_v":[x[0].get_v() for x in self.network]}
+    """ this method returns a list containing the membrane potential of all neural populations sorted by id.
+    The file_format can be 'text' or 'binary' (see binary_io). In the binary case the records are sorted as in
+    the text file and the sidecar contains the record offsets of each population for fast slicing."""
+    def get_v(self, save_v=True, file_format='text'):
+        voltages = {"collector_v": self._split_packed([x[1].get_v() for x in self.network], self.dim_y),
+                    "blockers_v": self._split_packed([x[0].get_v() for x in self.network], 2 * self.dim_y)}
         if save_v:
             if not os.path.exists("./membrane_potentials"):
                 os.makedirs("./membrane_potentials")
             i = 0
-            while os.path.exists("./membrane_potentials/{0}_{1}_vmem.dat".format(self.experiment_name, i)):
+            extension = "bin" if file_format == 'binary' else "dat"
+            while os.path.exists("./membrane_potentials/{0}_{1}_vmem.{2}".format(self.experiment_name, i, extension)):
                 i += 1
-            with open('./membrane_potentials/{0}_{1}_vmem.dat'.format(self.experiment_name, i), 'w') as fv:
-                self._write_preamble(fv)
-                fv.write("### DATA FORMAT ###\n"
-                        "# Description: First all Blocker Populations are being printed. "
-                        "Then all Collector populations. Both are sorted by Population ID (i.e. order of creation). "
-                        "Each Blocker/Collector Population lists all neurons, sorted by Neuron ID. "
-                        "There are two times more Blocker than Collector Neurons.\n"
-                        "# Each row contains: "
-                        "Blocker/Collector tag (b/c) -- Population ID -- Neuron ID -- Time -- Membrane Potential\n"
-                        "### DATA START ###\n")
-                for pop_id, pop_v in enumerate(voltages["blockers_v"]):
-                    for v in pop_v:
-                        fv.write("b " + str(int(pop_id)) + " " + str(int(v[0])) + " " + str(v[1]) + " " + str(v[2]) + "\n")
-                for pop_id, pop_v in enumerate(voltages["collector_v"]):
-                    for v in pop_v:
-                        fv.write("c " + str(int(pop_id)) + " " + str(int(v[0])) + " " + str(v[1]) + " " + str(v[2]) + "\n")
-                fv.write("### DATA END ###")
-                fv.close()
+            if file_format == 'binary':
+                records = []
+                offsets = {"b": [0], "c": [0]}
+                for tag, key in (("b", "blockers_v"), ("c", "collector_v")):
+                    for pop_id, pop_v in enumerate(voltages[key]):
+                        pop_v = np.asarray(pop_v, dtype=np.float64).reshape(-1, 3)
+                        pop_records = np.empty(len(pop_v), dtype=VOLTAGES_DTYPE)
+                        pop_records['tag'] = tag
+                        pop_records['population'] = pop_id
+                        pop_records['neuron'] = pop_v[:, 0]
+                        pop_records['t'] = pop_v[:, 1]
+                        pop_records['v'] = pop_v[:, 2]
+                        records.append(pop_records)
+                        offsets[tag].append(offsets[tag][-1] + len(pop_records))
+                # collector offsets are relative to the end of the blocker records
+                offsets["c"] = [offsets["b"][-1] + o for o in offsets["c"]]
+                write_binary('./membrane_potentials/{0}_{1}_vmem.bin'.format(self.experiment_name, i),
+                             np.concatenate(records) if records else np.zeros(0, dtype=VOLTAGES_DTYPE),
+                             meta={'preamble': self._preamble_data(),
+                                   'offsets': offsets,
+                                   'description': "First all Blocker Populations, then all Collector "
+                                                  "Populations, both sorted by Population ID and Neuron ID."})
+            else:
+                with open('./membrane_potentials/{0}_{1}_vmem.dat'.format(self.experiment_name, i), 'w') as fv:
+                    self._write_preamble(fv)
+                    fv.write("### DATA FORMAT ###\n"
+                            "# Description: First all Blocker Populations are being printed. "
+                            "Then all Collector populations. Both are sorted by Population ID (i.e. order of creation). "
+                            "Each Blocker/Collector Population lists all neurons, sorted by Neuron ID. "
+                            "There are two times more Blocker than Collector Neurons.\n"
+                            "# Each row contains: "
+                            "Blocker/Collector tag (b/c) -- Population ID -- Neuron ID -- Time -- Membrane Potential\n"
+                            "### DATA START ###\n")
+                    for pop_id, pop_v in enumerate(voltages["blockers_v"]):
+                        for v in pop_v:
+                            fv.write("b " + str(int(pop_id)) + " " + str(int(v[0])) + " " + str(v[1]) + " " + str(v[2]) + "\n")
+                    for pop_id, pop_v in enumerate(voltages["collector_v"]):
+                        for v in pop_v:
+                            fv.write("c " + str(int(pop_id)) + " " + str(int(v[0])) + " " + str(v[1]) + " " + str(v[2]) + "\n")
+                    fv.write("### DATA END ###")
+                    fv.close()
         return voltages
 
+    def _preamble_data(self):
+        """the information of the text preamble as a dictionary, used for the sidecar of the binary output."""
+        return {'experiment_name': self.experiment_name,
+                'network_dimensions': self.get_network_dimensions(),
+                'topological': dict(self.cell_params['topological']),
+                'neural': dict(self.cell_params['neural']),
+                'synaptic': dict(self.cell_params['synaptic'])}
+
     def _write_preamble(self, opened_file_descriptor):
         if opened_file_descriptor is not None:
             f = opened_file_descriptor
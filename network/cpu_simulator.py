@@ -0,0 +1,366 @@
+import numpy as np
+import scipy.sparse as sparse
+
+# A time-stepped reference simulator for current based leaky integrate-and-fire neurons with exponential synapses.
+# It implements the subset of the PyNN API which is used by this project (setup/run/end, Population, Projection,
+# OneToOneConnector, FromListConnector, IF_curr_exp, SpikeSourceArray) and can stand in for spynnaker.pyNN
+# (see backend.py). The synaptic weights are stored in one sparse matrix per target and delay.
+# The state of the neurons has a leading batch dimension: with setup(batch_size=n) the same network is simulated
+# for n different inputs at once (see Population.set_batch and batch.py), sharing the connectivity.
+
+
+class IF_curr_exp(object):
+    default_parameters = {'cm': 1.0,            # nF
+                          'tau_m': 20.0,        # ms
+                          'tau_refrac': 0.1,    # ms
+                          'tau_syn_E': 5.0,     # ms
+                          'tau_syn_I': 5.0,     # ms
+                          'v_rest': -65.0,      # mV
+                          'v_reset': -65.0,     # mV
+                          'v_thresh': -50.0,    # mV
+                          'i_offset': 0.0}      # nA
+
+
+class SpikeSourceArray(object):
+    default_parameters = {'spike_times': []}
+
+
+class Line(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+_simulator = None
+
+
+def setup(timestep=0.1, min_delay=None, max_delay=None, batch_size=1, **extra_params):
+    global _simulator
+    _simulator = _Simulator(timestep=timestep, batch_size=batch_size)
+    return 0
+
+
+def run(simulation_time):
+    _get_simulator().run(simulation_time)
+    return _simulator.time
+
+
+def end():
+    global _simulator
+    _simulator = None
+
+
+def clear_recordings():
+    """drops the recorded spikes and voltages, e.g. after they have been stored for a slice of a segmented run."""
+    _get_simulator().clear_recordings()
+
+
+def get_current_time():
+    return _get_simulator().time
+
+
+def _get_simulator():
+    assert _simulator is not None, "ERROR: The simulator is not set up. Call setup() first."
+    return _simulator
+
+
+class Population(object):
+    def __init__(self, size, cellclass, cellparams=None, label=None, structure=None):
+        self.size = size
+        self.celltype = cellclass
+        self.label = label if label is not None else "Population {0}".format(id(self))
+        self.parameters = dict(cellclass.default_parameters)
+        if cellparams is not None:
+            self.parameters.update(cellparams)
+        self.record_spikes = False
+        self.record_voltages = False
+        self.batch_parameters = None
+        self._simulator = _get_simulator()
+        self.first_id = self._simulator.register_population(self)
+
+    def __len__(self):
+        return self.size
+
+    def record(self, *args, **kwargs):
+        self.record_spikes = True
+
+    def record_v(self, *args, **kwargs):
+        self.record_voltages = True
+
+    def set(self, parameter, value=None):
+        """sets a parameter for all neurons, e.g. new spike times of a SpikeSourceArray between two runs."""
+        parameters = parameter if isinstance(parameter, dict) else {parameter: value}
+        self.parameters.update(parameters)
+        self._simulator.invalidate(self)
+
+    def tset(self, parameter, values):
+        self.set(parameter, values)
+
+    def set_batch(self, parameter, values):
+        """sets a parameter separately for each item of the batch, e.g. the spike times of a SpikeSourceArray for
+        each of the simulated inputs. len(values) has to be the batch size given in setup()."""
+        assert len(values) == self._simulator.batch_size, \
+            "ERROR: Expected {0} values, one for each item of the batch.".format(self._simulator.batch_size)
+        if self.batch_parameters is None:
+            self.batch_parameters = dict()
+        self.batch_parameters[parameter] = list(values)
+        self._simulator.invalidate(self)
+
+    def spike_times(self, batch=0):
+        """spike times of a SpikeSourceArray as one array per neuron. A flat list is shared by all neurons."""
+        if self.batch_parameters is not None and 'spike_times' in self.batch_parameters:
+            times = self.batch_parameters['spike_times'][batch]
+        else:
+            times = self.parameters['spike_times']
+        if len(times) > 0 and np.ndim(times[0]) == 0:
+            times = [times] * self.size
+        elif len(times) == 0:
+            times = [[]] * self.size
+        return [np.asarray(t, dtype=np.float64).ravel() for t in times]
+
+    def getSpikes(self, batch=0, *args, **kwargs):
+        """rows of (neuron id, spike time) for the given batch item"""
+        return self._simulator.get_spikes(self, batch)
+
+    def get_spike_counts(self, batch=0, *args, **kwargs):
+        spikes = self.getSpikes(batch)
+        ids, counts = np.unique(spikes[:, 0].astype(np.int64), return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+
+    def get_v(self, batch=0, *args, **kwargs):
+        """rows of (neuron id, time, membrane potential) for the given batch item"""
+        return self._simulator.get_v(self, batch)
+
+
+class OneToOneConnector(object):
+    def __init__(self, weights=0.0, delays=None, **kwargs):
+        self.weights = weights
+        self.delays = delays
+
+    def connect(self, pre, post, timestep):
+        assert pre.size == post.size, "ERROR: OneToOneConnector requires populations of equal size."
+        ids = np.arange(pre.size)
+        delays = self.delays if self.delays is not None else timestep
+        return ids, ids, np.ones(pre.size) * self.weights, np.ones(pre.size) * delays
+
+
+class FromListConnector(object):
+    def __init__(self, conn_list, **kwargs):
+        self.conn_list = conn_list
+
+    def connect(self, pre, post, timestep):
+        conn_list = self.conn_list
+        if isinstance(conn_list, np.ndarray) and conn_list.dtype.names is not None:
+            names = conn_list.dtype.names
+            conn_list = np.column_stack([conn_list[n] for n in names[:4]])
+        conn_list = np.asarray(conn_list, dtype=np.float64).reshape(-1, 4)
+        return conn_list[:, 0].astype(np.int64), conn_list[:, 1].astype(np.int64), conn_list[:, 2], conn_list[:, 3]
+
+
+class Projection(object):
+    def __init__(self, presynaptic_population, postsynaptic_population, connector, target='excitatory',
+                 label=None, **kwargs):
+        assert target in ('excitatory', 'inhibitory'), "ERROR: Unknown synapse target {0}.".format(target)
+        self.pre = presynaptic_population
+        self.post = postsynaptic_population
+        self.target = target
+        self.label = label
+        simulator = _get_simulator()
+        pre_ids, post_ids, weights, delays = connector.connect(self.pre, self.post, simulator.timestep)
+        simulator.register_projection(self.pre.first_id + pre_ids, self.post.first_id + post_ids,
+                                      weights, delays, target)
+
+
+class _Simulator(object):
+    def __init__(self, timestep=0.1, batch_size=1):
+        self.timestep = timestep
+        self.batch_size = batch_size
+        self.time = 0.0
+        self.step = 0
+        self.populations = []
+        self.n_neurons = 0
+        self.edges = {'excitatory': [], 'inhibitory': []}
+        self.is_built = False
+        self.sources_changed = True
+
+    def register_population(self, population):
+        assert not self.is_built, "ERROR: Populations cannot be added after the simulation has been run."
+        first_id = self.n_neurons
+        self.populations.append(population)
+        self.n_neurons += population.size
+        return first_id
+
+    def register_projection(self, pre, post, weights, delays, target):
+        assert not self.is_built, "ERROR: Projections cannot be added after the simulation has been run."
+        self.edges[target].append((pre, post, weights, delays))
+
+    def invalidate(self, population):
+        if population.celltype is SpikeSourceArray:
+            self.sources_changed = True
+
+    def _build(self):
+        n = self.n_neurons
+        dt = self.timestep
+        parameters = dict((k, np.zeros(n)) for k in IF_curr_exp.default_parameters)
+        self.is_neuron = np.zeros(n, dtype=bool)
+        self.record_spikes = np.zeros(n, dtype=bool)
+        self.record_voltages = np.zeros(n, dtype=bool)
+        for pop in self.populations:
+            ids = slice(pop.first_id, pop.first_id + pop.size)
+            self.record_spikes[ids] = pop.record_spikes
+            self.record_voltages[ids] = pop.record_voltages
+            if pop.celltype is IF_curr_exp:
+                self.is_neuron[ids] = True
+                for k in parameters:
+                    parameters[k][ids] = pop.parameters[k]
+
+        # exact integration of the membrane and the synaptic currents over one time step
+        self.decay_m = np.exp(-dt / np.where(self.is_neuron, parameters['tau_m'], 1.0))
+        self.decay_e = np.exp(-dt / np.where(self.is_neuron, parameters['tau_syn_E'], 1.0))
+        self.decay_i = np.exp(-dt / np.where(self.is_neuron, parameters['tau_syn_I'], 1.0))
+        self.r_m = np.where(self.is_neuron, parameters['tau_m'] / np.where(self.is_neuron, parameters['cm'], 1.0), 0.0)
+        self.v_rest = parameters['v_rest']
+        self.v_reset = parameters['v_reset']
+        self.v_thresh = parameters['v_thresh']
+        self.i_offset = parameters['i_offset']
+        self.refractory_steps = np.ceil(parameters['tau_refrac'] / dt - 1e-9).astype(np.int64)
+
+        # one sparse (pre x post) weight matrix per target and delay (in time steps)
+        self.weights = {}
+        max_delay = 1
+        for target, edges in self.edges.items():
+            if not edges:
+                continue
+            pre, post, weights, delays = [np.concatenate(x) for x in zip(*edges)]
+            delay_steps = np.maximum(np.round(delays / dt).astype(np.int64), 1)
+            max_delay = max(max_delay, int(delay_steps.max()))
+            for d in np.unique(delay_steps):
+                selected = delay_steps == d
+                self.weights[(target, int(d))] = sparse.csr_matrix(
+                    (weights[selected], (pre[selected], post[selected])), shape=(n, n))
+        self.edges = None
+        self.ring_size = max_delay + 1
+
+        # the state has the shape (batch, neurons), the parameters are shared by all items of the batch
+        shape = (self.batch_size, n)
+        self.v = np.tile(np.where(self.is_neuron, self.v_rest, 0.0), (self.batch_size, 1))
+        self.i_exc = np.zeros(shape)
+        self.i_inh = np.zeros(shape)
+        self.refractory = np.zeros(shape, dtype=np.int64)
+        self.input_exc = np.zeros((self.ring_size,) + shape)
+        self.input_inh = np.zeros((self.ring_size,) + shape)
+
+        self.recorded_spikes = []
+        self.recorded_voltages = []
+        self.recorded_v_ids = np.flatnonzero(self.record_voltages)
+        self._spike_index = None
+        self.is_built = True
+
+    def _schedule_sources(self):
+        """all spikes of the spike source arrays as (time step, batch item, neuron id), sorted by time step."""
+        steps, batches, ids = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for pop in self.populations:
+            if pop.celltype is not SpikeSourceArray:
+                continue
+            for b in range(self.batch_size):
+                times = pop.spike_times(b)
+                lengths = [len(t) for t in times]
+                if sum(lengths) == 0:
+                    continue
+                steps.append(np.round(np.concatenate(times) / self.timestep).astype(np.int64))
+                batches.append(np.repeat(b, sum(lengths)))
+                ids.append(np.repeat(pop.first_id + np.arange(pop.size), lengths))
+        steps, batches, ids = np.concatenate(steps), np.concatenate(batches), np.concatenate(ids)
+        order = np.argsort(steps, kind='mergesort')
+        self.source_steps, self.source_batches, self.source_ids = steps[order], batches[order], ids[order]
+        self.sources_changed = False
+
+    def run(self, simulation_time):
+        if not self.is_built:
+            self._build()
+        if self.sources_changed:
+            self._schedule_sources()
+
+        n_steps = int(round(simulation_time / self.timestep))
+        self._spike_index = None
+        source_bounds = np.searchsorted(self.source_steps, np.arange(self.step, self.step + n_steps + 1))
+        for k in range(n_steps):
+            sources = slice(source_bounds[k], source_bounds[k + 1])
+            self._update(self.source_batches[sources], self.source_ids[sources])
+        self.time = self.step * self.timestep
+
+    def _update(self, source_batches, source_ids):
+        slot = self.step % self.ring_size
+        self.i_exc += self.input_exc[slot]
+        self.i_inh += self.input_inh[slot]
+        self.input_exc[slot] = 0.0
+        self.input_inh[slot] = 0.0
+
+        integrating = self.is_neuron & (self.refractory == 0)
+        v_inf = self.v_rest + (self.i_exc - self.i_inh + self.i_offset) * self.r_m
+        self.v = np.where(integrating, v_inf + (self.v - v_inf) * self.decay_m, self.v)
+        self.refractory = np.maximum(self.refractory - 1, 0)
+
+        fired = integrating & (self.v >= self.v_thresh)
+        fired_batches, fired_ids = np.nonzero(fired)
+        self.v[fired_batches, fired_ids] = self.v_reset[fired_ids]
+        self.refractory[fired_batches, fired_ids] = self.refractory_steps[fired_ids]
+        fired[source_batches, source_ids] = True
+        fired_batches, fired_ids = np.nonzero(fired)
+
+        self.i_exc *= self.decay_e
+        self.i_inh *= self.decay_i
+
+        if fired_ids.size > 0:
+            # (batch x pre) spikes times (pre x post) weights, touching only the synapses of the spiking neurons
+            spikes = sparse.csr_matrix((np.ones(fired_ids.size), (fired_batches, fired_ids)), shape=fired.shape)
+            for (target, delay), weights in self.weights.items():
+                buffer = self.input_exc if target == 'excitatory' else self.input_inh
+                synaptic_input = spikes.dot(weights).tocoo()
+                buffer[(self.step + delay) % self.ring_size][synaptic_input.row, synaptic_input.col] += \
+                    synaptic_input.data
+            recorded = self.record_spikes[fired_ids]
+            if recorded.any():
+                self.recorded_spikes.append((self.step, fired_batches[recorded], fired_ids[recorded]))
+        if self.recorded_v_ids.size > 0:
+            self.recorded_voltages.append(self.v[:, self.recorded_v_ids])
+        self.step += 1
+
+    def clear_recordings(self):
+        if self.is_built:
+            self.recorded_spikes = []
+            self.recorded_voltages = []
+            self._spike_index = None
+
+    def _get_spike_index(self):
+        # the recorded spikes are concatenated once per recording state (until the next run or clear_recordings):
+        # the time steps and neuron ids in the order of recording, the key batch * n_neurons + id of each spike
+        # sorted, and the positions of the spikes in that order
+        if self._spike_index is None:
+            steps = np.concatenate([np.repeat(s, ids.size) for s, _, ids in self.recorded_spikes])
+            batches = np.concatenate([b for _, b, _ in self.recorded_spikes])
+            ids = np.concatenate([ids for _, _, ids in self.recorded_spikes])
+            keys = batches * self.n_neurons + ids
+            order = np.argsort(keys, kind='mergesort')
+            self._spike_index = (steps, ids, keys[order], order)
+        return self._spike_index
+
+    def get_spikes(self, population, batch=0):
+        if not self.is_built or not self.recorded_spikes:
+            return np.zeros((0, 2))
+        steps, ids, sorted_keys, order = self._get_spike_index()
+        first_key = batch * self.n_neurons + population.first_id
+        begin, end = np.searchsorted(sorted_keys, [first_key, first_key + population.size])
+        # the spikes of the population in the order of recording
+        mine = np.sort(order[begin:end])
+        return np.column_stack((ids[mine] - population.first_id, steps[mine] * self.timestep))
+
+    def get_v(self, population, batch=0):
+        if not self.is_built or not self.recorded_voltages:
+            return np.zeros((0, 3))
+        columns = np.flatnonzero((self.recorded_v_ids >= population.first_id) &
+                                 (self.recorded_v_ids < population.first_id + population.size))
+        voltages = np.asarray(self.recorded_voltages)[:, batch, columns]     # (time steps, neurons)
+        n_steps = voltages.shape[0]
+        times = (self.step - n_steps + np.arange(n_steps)) * self.timestep
+        ids = self.recorded_v_ids[columns] - population.first_id
+        return np.column_stack((np.repeat(ids, n_steps), np.tile(times, ids.size), voltages.T.ravel()))
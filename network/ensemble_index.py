@@ -0,0 +1,82 @@
+import numpy as np
+
+
+class EnsembleIndex(object):
+    """
+    Bookkeeping of the micro-ensembles of a cooperative network. Each ensemble is the intersection of the
+    projective line of the left pixel column x_left and the one of the right pixel column x_right,
+    where x_right = x_left + disparity. The ensembles are enumerated row by row along the left retina and,
+    within a row, by increasing disparity. All lookups are done on precomputed arrays and are O(1).
+    The optional ensemble_mask is a boolean array of shape (dim_x, max_disparity - min_disparity + 1), indexed by
+    [x_left, disparity - min_disparity], which prunes the ensembles where no match is possible (e.g. outside of the
+    known depth range of a scene). Pruned ensembles get no id and the remaining ones are enumerated as above.
+    """
+
+    def __init__(self, dim_x=1, max_disparity=0, min_disparity=0, ensemble_mask=None):
+        assert dim_x > max_disparity >= min_disparity >= 0, \
+            "ERROR: Disparity range is illegal! Creating Ensemble Index Failed."
+
+        self.dim_x = dim_x
+        self.min_disparity = min_disparity
+        self.max_disparity = max_disparity
+        n_disparities = max_disparity - min_disparity + 1
+
+        disparities = np.arange(min_disparity, max_disparity + 1)
+        grid_x, grid_d = np.meshgrid(np.arange(dim_x), disparities, indexing='ij')
+        valid = grid_x + grid_d < dim_x
+        if ensemble_mask is not None:
+            ensemble_mask = np.asarray(ensemble_mask, dtype=bool)
+            assert ensemble_mask.shape == valid.shape, \
+                "ERROR: The ensemble mask must have the shape {0}. Creating Ensemble Index Failed.".format(valid.shape)
+            valid &= ensemble_mask
+        self.ensemble_mask = ensemble_mask
+
+        # the row-major order of the meshgrid is exactly the enumeration order of the ensembles
+        self.x_left = grid_x[valid]
+        self.disparity = grid_d[valid]
+        self.x_right = self.x_left + self.disparity
+        self.size = int(self.x_left.size)
+
+        # dense (x_left, disparity) -> ensemble id table, -1 where no ensemble exists
+        self._id_table = -np.ones((dim_x, n_disparities), dtype=np.int64)
+        self._id_table[self.x_left, self.disparity - min_disparity] = np.arange(self.size)
+
+        self._rows = self._group(self.x_left, np.arange(self.size), dim_x)
+        self._columns = self._group(self.x_right, np.lexsort((self.x_left, self.x_right)), dim_x)
+        self._diagonals = self._group(self.disparity - min_disparity,
+                                      np.lexsort((self.x_left, self.disparity)), n_disparities)
+
+    @staticmethod
+    def _group(keys, order, n_groups):
+        offsets = np.zeros(n_groups + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(keys, minlength=n_groups))
+        return order, offsets
+
+    def ensemble_id(self, x_left, disparity):
+        """returns the ensemble id(s) for the given left pixel column(s) and disparity(ies), -1 if there is none."""
+        return self._id_table[x_left, np.asarray(disparity) - self.min_disparity]
+
+    def row(self, x_left):
+        """all ensembles on the projective line of the left pixel column x_left, sorted by disparity."""
+        order, offsets = self._rows
+        return order[offsets[x_left]:offsets[x_left + 1]]
+
+    def column(self, x_right):
+        """all ensembles on the projective line of the right pixel column x_right, sorted by x_left."""
+        order, offsets = self._columns
+        return order[offsets[x_right]:offsets[x_right + 1]]
+
+    def diagonal(self, disparity):
+        """all ensembles which represent the given disparity, sorted by x_left."""
+        order, offsets = self._diagonals
+        d = disparity - self.min_disparity
+        return order[offsets[d]:offsets[d + 1]]
+
+    def rows(self):
+        return [self.row(x) for x in range(0, self.dim_x)]
+
+    def columns(self):
+        return [self.column(x) for x in range(0, self.dim_x)]
+
+    def diagonals(self):
+        return [self.diagonal(d) for d in range(self.min_disparity, self.max_disparity + 1)]
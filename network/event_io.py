@@ -0,0 +1,428 @@
+import numpy as np
+import multiprocessing
+import zipfile
+import struct
+import gzip
+import zlib
+import os
+
+from binary_io import read_binary
+from camera_formats import CAMERA_EXTENSIONS, camera_streams, read_camera
+
+# Shared loading of event recordings with time windows. The recordings are expected to be sorted by time, so that
+# the events of a window [begin, end) are found by binary search and only that slice is loaded:
+#   .dat    text files with one event per line, the timestamp being the first column. The line boundaries are
+#           found by bisecting the byte offsets of the file, so only the lines of the window are read and parsed
+#           (in parallel for larger windows, see parse_dat_file). Compressed .dat.gz files are parsed completely.
+#   .npz    NumPy archives with one (N, k) array per member, the timestamp being the first column. Members which
+#           are stored without compression (np.savez) are memory-mapped, compressed ones (np.savez_compressed)
+#           have to be loaded completely before the window can be sliced.
+#   .aedat  recordings of event cameras (see camera_formats), which are decoded completely before the window is
+#   .raw    sliced.
+
+
+def _columns_per_line(rawdata):
+    """the number of whitespace separated columns of each non-blank line of the text."""
+    data = np.frombuffer(rawdata, dtype=np.uint8)
+    is_space = (data == 32) | ((data >= 9) & (data <= 13))
+    token_starts = np.flatnonzero(~is_space & np.r_[True, is_space[:-1]])
+    line_ends = np.flatnonzero(data == 10)
+    counts = np.diff(np.r_[0, np.searchsorted(token_starts, line_ends), len(token_starts)])
+    return counts[counts > 0]
+
+
+def parse_dat(rawdata):
+    """parses the text of a .dat recording into an integer array with one row per (non-blank) line. The timestamps
+    of long recordings in microseconds exceed 32 bits, therefore all columns are parsed as 64 bit integers."""
+    columns = _columns_per_line(rawdata if isinstance(rawdata, str) else rawdata.encode('ascii'))
+    n_columns = columns[0] if len(columns) else 5
+    assert (columns == n_columns).all(), \
+        "ERROR: The lines of the .dat recording have different numbers of columns."
+    if "." in rawdata or "e" in rawdata or "E" in rawdata:
+        # timestamps given as floating point numbers are truncated
+        events = np.fromstring(rawdata, dtype=np.float64, sep=" ").astype(np.int64)
+    else:
+        events = np.fromstring(rawdata, dtype=np.int64, sep=" ")
+    assert events.size == len(columns) * n_columns, "ERROR: The .dat recording contains values which are no numbers."
+    return events.reshape(-1, n_columns)
+
+
+def _open_dat(file_path):
+    return gzip.open(file_path, 'rb') if file_path.endswith(".gz") else open(file_path, 'rb')
+
+
+def _to_text(rawdata):
+    return rawdata if isinstance(rawdata, str) else rawdata.decode('ascii')
+
+
+def _line_start(f, offset):
+    """the offset of the first line which begins at or after offset."""
+    if offset == 0:
+        return 0
+    f.seek(offset - 1)
+    f.readline()
+    return f.tell()
+
+
+def _parse_dat_range(args):
+    file_path, start, stop = args
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        return parse_dat(_to_text(f.read(stop - start)))
+
+
+def parse_dat_file(file_path, start=0, stop=None, n_processes=None, block_bytes=1 << 24):
+    """
+    Parses the lines of a (gzip compressed, if the name ends with .gz) .dat recording between the byte offsets
+    start and stop (which have to be line boundaries). Larger files are split into ranges of about block_bytes on
+    line boundaries, which are parsed in a pool of n_processes processes (one per core by default). Compressed
+    files are decompressed sequentially and their blocks are parsed in the pool.
+    """
+    if n_processes is None:
+        n_processes = multiprocessing.cpu_count()
+    if file_path.endswith(".gz"):
+        with _open_dat(file_path) as f:
+            blocks = _text_blocks(f, block_bytes)
+            if n_processes > 1:
+                pool = multiprocessing.Pool(processes=n_processes)
+                try:
+                    parts = list(pool.imap(parse_dat, blocks))
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                parts = [parse_dat(b) for b in blocks]
+    else:
+        stop = os.path.getsize(file_path) if stop is None else stop
+        with open(file_path, 'rb') as f:
+            bounds = sorted(set([start] + [_line_start(f, o) for o in range(start + block_bytes, stop, block_bytes)] +
+                                [stop]))
+        ranges = [(file_path, b, e) for b, e in zip(bounds[:-1], bounds[1:]) if e > b]
+        if n_processes > 1 and len(ranges) > 1:
+            pool = multiprocessing.Pool(processes=min(n_processes, len(ranges)))
+            try:
+                parts = pool.map(_parse_dat_range, ranges)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            parts = [_parse_dat_range(r) for r in ranges]
+    parts = [p for p in parts if len(p)]
+    return np.concatenate(parts) if parts else np.zeros((0, 5), dtype=np.int64)
+
+
+def window(times, begin=None, end=None, include_end=False):
+    """the slice of the sorted times which lies within [begin, end) ([begin, end] if include_end is set)."""
+    start = 0 if begin is None else int(np.searchsorted(times, begin, side='left'))
+    stop = len(times) if end is None else int(np.searchsorted(times, end, side='right' if include_end else 'left'))
+    return slice(start, max(start, stop))
+
+
+def _dat_timestamp(line):
+    return float(line.split(None, 1)[0])
+
+
+def _dat_offset(f, size, timestamp, side):
+    """the byte offset of the first line with a timestamp >= timestamp (side 'left') or > timestamp ('right')."""
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        # move to the beginning of the first line at or after mid
+        f.seek(mid - 1 if mid > 0 else 0)
+        if mid > 0:
+            f.readline()
+        line_start = f.tell()
+        line = f.readline()
+        # blank lines are skipped, only the end of the file has no timestamp
+        while line and not line.strip():
+            line_start = f.tell()
+            line = f.readline()
+        if not line:
+            hi = mid
+            continue
+        t = _dat_timestamp(line)
+        if t >= timestamp if side == 'left' else t > timestamp:
+            hi = mid
+        else:
+            lo = line_start + 1
+    f.seek(lo - 1 if lo > 0 else 0)
+    if lo > 0:
+        f.readline()
+    return f.tell()
+
+
+def read_dat(file_path, begin=None, end=None, include_end=False, n_processes=None):
+    """reads the events of a .dat recording within the time window (in the units of the recording). Compressed
+    recordings (.dat.gz) cannot be bisected, so they are parsed completely before the window is sliced."""
+    if file_path.endswith(".gz"):
+        events = parse_dat_file(file_path, n_processes=n_processes)
+        return events[window(events[:, 0], begin, end, include_end)]
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        start = 0 if begin is None else _dat_offset(f, size, begin, 'left')
+        stop = size if end is None else _dat_offset(f, size, end, 'right' if include_end else 'left')
+    return parse_dat_file(file_path, start, max(start, stop), n_processes=n_processes)
+
+
+def read_camera_window(file_path, begin=None, end=None, include_end=False, **decoder_params):
+    """reads the events of a camera recording (see camera_formats) within the time window (in us)."""
+    events = read_camera(file_path, **decoder_params)
+    return events[window(events[:, 0], begin, end, include_end)]
+
+
+def load_npz(file_path, keys=None):
+    """returns a dictionary with the arrays of a .npz archive. The members which are stored without compression
+    are memory-mapped, all others are loaded into memory."""
+    arrays = dict()
+    with zipfile.ZipFile(file_path) as archive:
+        members = [m for m in archive.infolist() if m.filename.endswith(".npy")]
+        for member in members:
+            key = member.filename[:-4]
+            if keys is not None and key not in keys:
+                continue
+            if member.compress_type == zipfile.ZIP_STORED:
+                arrays[key] = _memmap_member(file_path, member)
+            else:
+                arrays[key] = np.lib.format.read_array(archive.open(member))
+    return arrays
+
+
+def _memmap_member(file_path, member):
+    with open(file_path, 'rb') as f:
+        # the local file header has a fixed size of 30 bytes followed by the file name and an extra field
+        f.seek(member.header_offset)
+        local_header = f.read(30)
+        name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+        f.seek(member.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject or 0 in shape:
+        return np.load(file_path)[member.filename[:-4]]
+    return np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def read_npz(file_path, keys=None, begin=None, end=None, include_end=False):
+    """returns a dictionary with the events of each array of a .npz recording within the time window. For the
+    memory-mapped members only the window is read from the disk."""
+    arrays = load_npz(file_path, keys)
+    return dict((key, np.array(events[window(events[:, 0], begin, end, include_end)]))
+                for key, events in arrays.items())
+
+
+# Streaming access for recordings which do not fit into the memory. iter_events yields the events of a recording
+# as (N, 5) arrays of (t, x, y, p, retina) rows (integers, or floating point numbers for the .npz recordings with
+# floating point timestamps), either in chunks of at most chunk_size events or in chunks
+# covering chunk_duration time units each. Only a few blocks of block_rows events are held in memory at a time.
+
+# the record layout of binary event recordings (see binary_io)
+EVENTS_DTYPE = np.dtype([('t', np.int64), ('x', np.int32), ('y', np.int32), ('p', np.int32), ('retina', np.int32)])
+
+# the retina IDs with which the arrays of a .npz recording are tagged (as done by ExternalInputReader)
+NPZ_RETINA_IDS = {'left': 1, 'right': 0}
+
+
+def _text_blocks(file_object, block_bytes):
+    """reads a text stream block by block, splitting the blocks at line boundaries."""
+    remainder = ""
+    while True:
+        block = file_object.read(block_bytes)
+        block = _to_text(block)
+        if not block:
+            break
+        block = remainder + block
+        cut = block.rfind("\n") + 1
+        remainder = block[cut:]
+        if cut > 0:
+            yield block[:cut]
+    if remainder.strip():
+        yield remainder
+
+
+class GunzipStream(object):
+    """
+    Decompresses a gzip compressed stream which can not seek (e.g. a .dat.gz from urllib) incrementally. read
+    returns the data decompressed from the next size compressed bytes (an empty string only at the end of the
+    stream), as needed by iter_events. Concatenated gzip members are decompressed one after the other.
+    """
+
+    def __init__(self, file_object):
+        self.file_object = file_object
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._unused = b""
+        self._eof = False
+
+    def read(self, size):
+        data = b""
+        while not data and not self._eof:
+            compressed = self._unused or self.file_object.read(size)
+            self._unused = b""
+            if not compressed:
+                data = self._decompressor.flush()
+                self._eof = True
+                continue
+            data = self._decompressor.decompress(compressed)
+            if self._decompressor.unused_data:
+                # the beginning of the next gzip member
+                self._unused = self._decompressor.unused_data
+                data += self._decompressor.flush()
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return data
+
+    def close(self):
+        self.file_object.close()
+
+
+def _dat_blocks(file_object, block_bytes):
+    """parses a .dat text stream block by block."""
+    for block in _text_blocks(file_object, block_bytes):
+        yield parse_dat(block)
+
+
+def _dat_file_blocks(file_path, block_bytes):
+    with _open_dat(file_path) as f:
+        for block in _dat_blocks(f, block_bytes):
+            yield block
+
+
+def _npz_blocks(file_path, member, retina_id, block_rows):
+    """reads a (N, 4) array of a .npz recording block by block and tags it with the retina ID. Members stored
+    without compression are memory-mapped and compressed ones are decompressed incrementally. Floating point
+    timestamps are kept, i.e. the blocks of such a member are float64 arrays."""
+    if member.compress_type == zipfile.ZIP_STORED:
+        data = _memmap_member(file_path, member)
+        blocks = (data[i:i + block_rows] for i in range(0, len(data), block_rows))
+    else:
+        blocks = _compressed_npy_blocks(file_path, member, block_rows)
+    for block in blocks:
+        dtype = np.float64 if block.dtype.kind == 'f' else np.int64
+        yield np.column_stack((np.asarray(block, dtype=dtype), np.full(len(block), retina_id, dtype=dtype)))
+
+
+def _compressed_npy_blocks(file_path, member, block_rows):
+    with zipfile.ZipFile(file_path) as archive:
+        stream = archive.open(member)
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+        if fortran_order or len(shape) != 2:
+            # the rows are not contiguous in the file, so the array has to be read at once
+            yield np.lib.format.read_array(archive.open(member))
+            return
+        row_bytes = dtype.itemsize * shape[1]
+        for i in range(0, shape[0], block_rows):
+            n_rows = min(block_rows, shape[0] - i)
+            raw = stream.read(n_rows * row_bytes)
+            yield np.frombuffer(raw, dtype=dtype).reshape(n_rows, shape[1])
+
+
+def _binary_blocks(file_path, block_rows):
+    records, _ = read_binary(file_path)
+    for i in range(0, len(records), block_rows):
+        block = records[i:i + block_rows]
+        yield np.column_stack([block[name].astype(np.int64) for name in EVENTS_DTYPE.names])
+
+
+class _BlockBuffer(object):
+    """buffers the blocks of one time-sorted event stream and hands out the events before a given time."""
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.buffer = np.zeros((0, 5), dtype=np.int64)
+        self.exhausted = False
+
+    def fill(self, n_rows):
+        # make sure that at least n_rows events are buffered (unless the stream ends)
+        parts = [self.buffer]
+        n_buffered = len(self.buffer)
+        while n_buffered < n_rows and not self.exhausted:
+            block = next(self.blocks, None)
+            if block is None:
+                self.exhausted = True
+            else:
+                parts.append(block)
+                n_buffered += len(block)
+        self.buffer = np.concatenate(parts) if len(parts) > 1 else self.buffer
+
+    def fill_until(self, limit):
+        # make sure that all events before limit are buffered. The blocks are collected until the last timestamp
+        # reaches limit and concatenated once.
+        parts = [self.buffer]
+        last = self.buffer[-1, 0] if len(self.buffer) else None
+        while not self.exhausted and (last is None or last < limit):
+            block = next(self.blocks, None)
+            if block is None:
+                self.exhausted = True
+            elif len(block):
+                parts.append(block)
+                last = block[-1, 0]
+        self.buffer = np.concatenate(parts) if len(parts) > 1 else self.buffer
+
+    def take_before(self, limit, include_limit=False):
+        self.fill_until(limit + 1 if include_limit else limit)
+        n = int(np.searchsorted(self.buffer[:, 0], limit, side='right' if include_limit else 'left'))
+        taken, self.buffer = self.buffer[:n], self.buffer[n:]
+        return taken
+
+    def empty(self):
+        self.fill(1)
+        return len(self.buffer) == 0
+
+
+def iter_events(source, chunk_size=None, chunk_duration=None, block_rows=1 << 16, decoder_params=None):
+    """
+    Yields the events of a .dat (or .dat.gz), .npz, camera (.aedat or .raw, see camera_formats and decoder_params) or
+    binary (.bin, see binary_io and EVENTS_DTYPE) recording, or of an open .dat text stream (e.g. from urllib, wrapped
+    in a GunzipStream for a .dat.gz), in chunks of (N, 5) arrays of (t, x, y, p, retina) rows. The rows are integers,
+    except for the .npz recordings with floating point timestamps, whose chunks are float64 arrays.
+    With chunk_duration each chunk covers [t0 + k * chunk_duration, t0 + (k + 1) * chunk_duration), where t0 is
+    the first timestamp. Otherwise each chunk has chunk_size events (block_rows if not given), except that the
+    events with the same timestamp are never split. The events of all arrays of a .npz recording are merged by time.
+    """
+    if hasattr(source, 'read'):
+        streams = [_dat_blocks(source, block_rows * 32)]
+    elif source.endswith((".dat", ".dat.gz")):
+        streams = [_dat_file_blocks(source, block_rows * 32)]
+    elif source[-4:] == ".npz":
+        with zipfile.ZipFile(source) as archive:
+            members = dict((m.filename[:-4], m) for m in archive.infolist() if m.filename.endswith(".npy"))
+        streams = [_npz_blocks(source, members[key], NPZ_RETINA_IDS[key], block_rows)
+                   for key in sorted(NPZ_RETINA_IDS) if key in members]
+    elif source.endswith(CAMERA_EXTENSIONS):
+        # (the sources of an AEDAT 3.1 recording overlap in time and are merged like the arrays of a .npz)
+        streams = camera_streams(source, block_rows, **(decoder_params or {}))
+    else:
+        streams = [_binary_blocks(source, block_rows)]
+    buffers = [_BlockBuffer(s) for s in streams]
+
+    if chunk_duration is None and chunk_size is None:
+        chunk_size = block_rows
+    chunk_begin = None
+    # (a list, such that all buffers are filled before the first timestamps are compared)
+    while not all([b.empty() for b in buffers]):
+        if chunk_duration is not None:
+            first = min(b.buffer[0, 0] for b in buffers if len(b.buffer))
+            if chunk_begin is None:
+                chunk_begin = first
+            # skip the empty chunks of longer pauses in the recording
+            chunk_begin += (first - chunk_begin) // chunk_duration * chunk_duration
+            chunk_end, include_end = chunk_begin + chunk_duration, False
+            chunk_begin = chunk_end
+        else:
+            # the chunk ends at the chunk_size-th smallest of the buffered timestamps of all streams
+            for b in buffers:
+                b.fill(chunk_size)
+            heads = np.sort(np.concatenate([b.buffer[:chunk_size, 0] for b in buffers]))
+            chunk_end, include_end = heads[min(chunk_size, len(heads)) - 1], True
+        chunk = [b.take_before(chunk_end, include_end) for b in buffers]
+        chunk = np.concatenate(chunk) if len(chunk) > 1 else chunk[0]
+        if len(buffers) > 1:
+            chunk = chunk[np.argsort(chunk[:, 0], kind='mergesort')]
+        if len(chunk):
+            yield chunk
@@ -1,10 +1,306 @@
 import urllib
+from contextlib import closing
+import hashlib
+import json
+import os
+import zlib
+import numpy as np
+
+from pixel_spike_times import PixelSpikeTimes
+from event_io import parse_dat, read_dat, read_npz, read_camera_window, load_npz, window, iter_events, NPZ_RETINA_IDS, \
+    GunzipStream
+from camera_formats import CAMERA_EXTENSIONS, CAMERA_DECODER_VERSION
+
+# the minimum time (in ms) between two spikes of the same pixel, used to filter event bursts
+REFRACTORY_PERIOD = 1.0
+
+# the counters of the preprocessing statistics of each retina: the number of events with the retina ID within the
+# simulation time (the readers only read the events of this window), the number of events which have been dropped
+# (outside of the crop window, from a hot pixel, without coincidence or within the refractory period), the number of
+# accepted spikes and of masked hot pixels
+STATISTICS_KEYS = ('events', 'outside_view', 'hot_pixel', 'coincidence', 'refractory', 'accepted', 'hot_pixels')
+
+
+def _first_accepted(keys, pixels, times, reference, begin, end, refractory):
+    """for each query, the index of the first event in [begin, end) (the events of one pixel, sorted by time)
+    which is at least refractory after the reference time, or end if there is none. The candidates are found by
+    binary search and then corrected such that the result is the same as with the subtraction of the event loop."""
+    j = np.searchsorted(keys, pixels + 1j * (reference + refractory))
+    j = np.clip(j, begin, end)
+    while True:
+        back = j - 1
+        step_back = (back >= begin) & (times[np.minimum(back, len(times) - 1)] - reference >= refractory)
+        step_forward = (j < end) & ~(times[np.minimum(j, len(times) - 1)] - reference >= refractory)
+        if not (step_back.any() or step_forward.any()):
+            return j
+        j = j - step_back + step_forward
+
+
+def refractory_filter(pixels, times, initial_times, refractory=REFRACTORY_PERIOD):
+    """
+    Vectorised burst filter: an event is accepted if it is at least refractory later than the previously accepted
+    event of the same pixel (or than the initial time of the pixel). The events have to be sorted by pixel and then
+    by time. Returns a boolean mask of the accepted events.
+    """
+    n = len(times)
+    accepted = np.zeros(n, dtype=bool)
+    if n == 0:
+        return accepted
+    times = np.asarray(times)
+    keys = pixels + 1j * times      # complex numbers are compared lexicographically, i.e. by pixel, then time
+    ends = np.searchsorted(pixels, pixels, side='right')
+    # the next accepted event after each event, n if there is none (the sentinel points to itself)
+    following = np.empty(n + 1, dtype=np.int64)
+    following[:n] = _first_accepted(keys, pixels, times, times, np.arange(n) + 1, ends, refractory)
+    following[:n][following[:n] == ends] = n
+    following[n] = n
+
+    # the first accepted event of each pixel
+    starts = np.flatnonzero(np.r_[True, pixels[1:] != pixels[:-1]])
+    firsts = _first_accepted(keys, pixels[starts], times, initial_times[starts], starts, ends[starts], refractory)
+    firsts[firsts == ends[starts]] = n
+
+    # follow the chains of accepted events by pointer doubling: after k steps all events which are at most
+    # 2^k - 1 hops away from the first accepted event of their pixel are marked
+    reached = np.zeros(n + 1, dtype=bool)
+    reached[firsts] = True
+    jump = following
+    while True:
+        newly = np.zeros(n + 1, dtype=bool)
+        newly[jump[reached]] = True
+        newly &= ~reached
+        if not newly[:n].any():
+            break
+        reached |= newly
+        jump = jump[jump]
+    accepted[:] = reached[:n]
+    return accepted
+
+
+def coincidence_filter(pixels, times, previous_times, window):
+    """
+    Vectorised coincidence detector: an event is accepted if the n - 1 events of the same pixel before it (n - 1
+    being the number of columns of previous_times) are at most window earlier. previous_times holds the last n - 1
+    times of the pixel of each event before the first event of the pixel (oldest first, -inf if there are fewer).
+    The events have to be sorted by pixel and then by time. Returns a boolean mask of the accepted events.
+    """
+    n_previous = previous_times.shape[1]
+    if n_previous == 0 or len(times) == 0:
+        return np.ones(len(times), dtype=bool)
+    index = np.arange(len(times))
+    first_of_pixel = np.r_[True, pixels[1:] != pixels[:-1]]
+    rank = index - np.maximum.accumulate(np.where(first_of_pixel, index, 0))
+    earlier = np.where(rank >= n_previous, times[np.maximum(index - n_previous, 0)],
+                       previous_times[index, np.minimum(rank, n_previous - 1)])
+    return times - earlier <= window
+
+
+class EventPreprocessor(object):
+    """
+    Crops the events of a recording, splits them into the left and the right retina and filters event bursts.
+    The events can be passed in several chunks (sorted by time), since the last spike time of each pixel is carried
+    over from one chunk to the next. The times are converted to ms and shifted by sim_time_begin.
+    With a pool_size k > 1 the k x k blocks of sensor pixels (within the crop window of dim_x * k by dim_y * k
+    pixels) are pooled into one retina pixel. With the pool_rule 'refractory' all events of a block are merged and
+    only the refractory filter is applied, with 'coincidence' a block only emits a spike if coincidence_events of
+    its events lie within coincidence_window ms (before the refractory filter is applied).
+    Hot pixels are found from the event rates of the sensor pixels, which have to be counted (count) before the
+    events are processed. All sensor pixels above hot_pixel_rate (in events per second) are masked (mask_hot_pixels).
+    The statistics record how many events of each retina have been dropped and why.
+    """
+
+    def __init__(self, dim_x=1, dim_y=1, crop_xmin=-1, crop_ymin=-1, crop_xmax=-1, crop_ymax=-1,
+                 sim_time=1000, is_rawdata_time_in_ms=False, sim_time_begin=0, spike_times_dtype=np.float64,
+                 pool_size=1, pool_rule='refractory', coincidence_events=2, coincidence_window=1.0,
+                 refractory_period=REFRACTORY_PERIOD):
+        assert pool_size >= 1, "ERROR: The pool size has to be at least 1."
+        assert pool_rule in ('refractory', 'coincidence'), "ERROR: Unknown pooling rule {0}.".format(pool_rule)
+        self.dim_x = dim_x
+        self.dim_y = dim_y
+        self.crop = (crop_xmin, crop_ymin, crop_xmax, crop_ymax)
+        self.sim_time = sim_time
+        self.is_rawdata_time_in_ms = is_rawdata_time_in_ms
+        self.sim_time_begin = sim_time_begin
+        self.spike_times_dtype = spike_times_dtype
+        self.pool_size = pool_size
+        self.pool_rule = pool_rule
+        self.coincidence_window = coincidence_window
+        self.refractory_period = refractory_period
+        # the last coincidence_events - 1 input events of each pooled pixel (oldest first)
+        n_previous = coincidence_events - 1 if pool_rule == 'coincidence' else 0
+        self.previous_times = np.full((2 * dim_x * dim_y, n_previous), -np.inf)
+        # the last spike time of each pixel (the right retina after the left one) is initialised with -1.0 except
+        # for the first pixel of each retina (0.0)
+        self.last_times = np.full(2 * dim_x * dim_y, -1.0)
+        self.last_times[[0, dim_x * dim_y]] = 0.0
+        self._pixels = []
+        self._times = []
+
+        # the event counts of the sensor pixels within the crop window (indexed by [retina, x, y]) and the time span
+        # (in ms) over which they have been counted
+        self.sensor_shape = (2, dim_x * pool_size, dim_y * pool_size)
+        self.event_counts = np.zeros(self.sensor_shape, dtype=np.int64)
+        self._count_span = [np.inf, -np.inf]
+        self.hot_pixels = None
+        self.statistics = dict((side, dict((key, 0) for key in STATISTICS_KEYS)) for side in ("left", "right"))
+
+    def _sensor_events(self, events):
+        # the sensor pixel coordinates relative to the crop window, the times in ms (relative to sim_time_begin), the
+        # retina ids and the masks of the events within the simulation time and within the crop window
+        crop_xmin, crop_ymin, crop_xmax, crop_ymax = self.crop
+        x = events[:, 1].astype(np.int64) - 1
+        y = events[:, 2].astype(np.int64) - 1
+        retina_ids = events[:, 4].astype(np.int64)
+        if not self.is_rawdata_time_in_ms:
+            t = events[:, 0] / 1000.0  # retina event time steps are in micro seconds, so convert to milliseconds
+        else:
+            t = events[:, 0]
+        if self.sim_time_begin != 0:
+            t = t - self.sim_time_begin
+
+        # take events only from the within of a window centered at the retina view center. Events after the
+        # simulation time are discarded.
+        if crop_xmax >= 0 and crop_xmin >= 0 and crop_ymax >= 0 and crop_ymin >= 0:
+            in_view = (crop_xmin <= x) & (x < crop_xmax) & (crop_ymin <= y) & (y < crop_ymax)
+            x, y = x - crop_xmin, y - crop_ymin
+        else:
+            in_view = np.ones(len(x), dtype=bool)
+        in_view &= (0 <= x) & (x < self.sensor_shape[1]) & (0 <= y) & (y < self.sensor_shape[2])
+        in_time = ((retina_ids == 0) | (retina_ids == 1)) & (0 <= t) & (t <= self.sim_time)
+        return x, y, t, retina_ids, in_time, in_view
+
+    def count(self, events):
+        """counts the events of each sensor pixel (for the detection of hot pixels)."""
+        x, y, t, retina_ids, in_time, in_view = self._sensor_events(events)
+        selected = in_time & in_view
+        np.add.at(self.event_counts, (retina_ids[selected], x[selected], y[selected]), 1)
+        if selected.any():
+            self._count_span = [min(self._count_span[0], t[selected].min()),
+                                max(self._count_span[1], t[selected].max())]
+
+    def pixel_rates(self):
+        """the event rates (in events per second) of the sensor pixels (indexed by [retina, x, y]) over the counted
+        time span."""
+        span = max(self._count_span[1] - self._count_span[0], 1.0) if self.event_counts.any() else 1.0
+        return self.event_counts * 1000.0 / span
+
+    def mask_hot_pixels(self, hot_pixel_rate):
+        """masks all sensor pixels whose event rate is above hot_pixel_rate (in events per second)."""
+        self.hot_pixels = self.pixel_rates() > hot_pixel_rate
+        for retina_id, side in enumerate(("left", "right")):
+            self.statistics[side]['hot_pixels'] = int(self.hot_pixels[retina_id].sum())
+        return self.hot_pixels
+
+    def _record(self, reason, retina_ids):
+        counts = np.bincount(retina_ids, minlength=2)
+        self.statistics['left'][reason] += int(counts[0])
+        self.statistics['right'][reason] += int(counts[1])
+
+    def process(self, events):
+        """processes an (N, 5) array of (t, x, y, p, retina) rows."""
+        dim_x, dim_y = self.dim_x, self.dim_y
+        x, y, t, retina_ids, in_time, in_view = self._sensor_events(events)
+        self._record('events', retina_ids[in_time])
+        self._record('outside_view', retina_ids[in_time & ~in_view])
+        selected = in_time & in_view
+        if self.hot_pixels is not None:
+            hot = np.zeros(len(x), dtype=bool)
+            hot[selected] = self.hot_pixels[retina_ids[selected], x[selected], y[selected]]
+            self._record('hot_pixel', retina_ids[hot])
+            selected &= ~hot
+        x, y, t, retina_ids = x[selected], y[selected], t[selected], retina_ids[selected]
+        if self.pool_size > 1:
+            x, y = x // self.pool_size, y // self.pool_size
+
+        # sort by pixel (the right retina after the left one) and time and filter event bursts
+        pixels = (retina_ids * dim_x + x) * dim_y + y
+        order = np.lexsort((t, pixels))
+        pixels, t = pixels[order], t[order]
+        if self.previous_times.shape[1]:
+            coincident = coincidence_filter(pixels, t, self.previous_times[pixels], self.coincidence_window)
+            self._carry_previous_times(pixels, t)
+            self._record('coincidence', pixels[~coincident] // (dim_x * dim_y))
+            pixels, t = pixels[coincident], t[coincident]
+        accepted = refractory_filter(pixels, t, self.last_times[pixels], self.refractory_period)
+        self._record('refractory', pixels[~accepted] // (dim_x * dim_y))
+        pixels, t = pixels[accepted], t[accepted]
+        self._record('accepted', pixels // (dim_x * dim_y))
+
+        # carry the last accepted spike of each pixel over to the next chunk
+        last_of_pixel = np.r_[pixels[1:] != pixels[:-1], True] if len(pixels) else np.zeros(0, dtype=bool)
+        self.last_times[pixels[last_of_pixel]] = t[last_of_pixel]
+        self._pixels.append(pixels)
+        self._times.append(t)
+
+    def _carry_previous_times(self, pixels, t):
+        # keep the last input events of each pooled pixel for the coincidence detection in the next chunk
+        if len(pixels) == 0:
+            return
+        last = np.flatnonzero(np.r_[pixels[1:] != pixels[:-1], True])
+        counts = np.diff(np.r_[-1, last])
+        updated = self.previous_times[pixels[last]]
+        n_previous = updated.shape[1]
+        for j in range(0, n_previous):
+            from_end = n_previous - j
+            from_chunk = counts >= from_end
+            shifted = self.previous_times[pixels[last], np.minimum(j + counts, n_previous - 1)]
+            updated[:, j] = np.where(from_chunk, t[np.maximum(last - from_end + 1, 0)], shifted)
+        self.previous_times[pixels[last]] = updated
+
+    def spike_times(self):
+        """the filtered spike times of the left and of the right retina (see PixelSpikeTimes). Pixels without any
+        spike are empty, the Retina pads them only for backends which require so."""
+        n_pixels = self.dim_x * self.dim_y
+        if self._pixels:
+            pixels, t = np.concatenate(self._pixels), np.concatenate(self._times)
+        else:
+            pixels, t = np.zeros(0, dtype=np.int64), np.zeros(0)
+        # initialise the maximum time constant as the total simulation duration. This is needed to set a value
+        # for pixels which don't spike at all, since the pyNN frontend requires so.
+        # If they spike at the last possible time step, their firing will have no effect on the simulation.
+        pad_time = self.sim_time + 10
+        # the chunks are in the order of time, so the stable sort keeps the spikes of each pixel sorted
+        right = pixels >= n_pixels
+        return [PixelSpikeTimes.from_events(pixels[selected] - offset, t[selected], self.dim_x, self.dim_y,
+                                            pad_time=pad_time, dtype=self.spike_times_dtype)
+                for selected, offset in ((~right, 0), (right, n_pixels))]
+
+
+def _input_cache_key(url, file_path, parameters):
+    """a hash of the content of the source and of all parameters which affect the preprocessing. The content behind
+    a url may change, so it is downloaded (block by block) and hashed as well."""
+    source_hash = hashlib.sha1()
+    with closing(open(file_path, 'rb') if file_path is not "" else urllib.urlopen(url)) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            source_hash.update(block)
+    key = dict(parameters, source=source_hash.hexdigest())
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
 
 # This class reads spikes from an external input source (url or local file) and preprocesses the spikes for the retinas
 # The spikes should be stored in a file with an extension ".dat" and should be formatted as follows:
 # spike_time position_x position_y polarity retina
 # where spike_time is in microseconds, position_x and position_y are pixel coordinates in the range [1, dim_x(dim_y)]
 # polarity is the event type (0 OFF, 1 ON) and retina is the retina ID (0 left, 1 right) (or the other way round :D)
+# A url has to point to such a .dat (or gzip compressed .dat.gz) file, the other recordings are read from local files.
+# Recordings of event cameras (AEDAT 2.0/3.1 .aedat and EVT 2.0 .raw files, with the time in microseconds) are
+# decoded directly (see camera_formats). The decoder_params select the retina of their events, e.g.
+# {'source_retinas': {1: 0, 2: 1}} for a stereo AEDAT 3.1 recording or {'retina': 1} for an EVT 2.0 recording.
+# Only the events within [sim_time_begin, sim_time_begin + sim_time] (in ms) are read (see event_io) and their
+# times are shifted such that sim_time_begin corresponds to the beginning of the simulation.
+# If chunk_size (in events) or chunk_duration (in ms) is given, the recording is streamed in chunks of this size
+# (see event_io.iter_events) instead of being read at once, so that the memory usage stays bounded.
+# The spike times of the retinas are stored as PixelSpikeTimes (use to_lists() for the former nested lists).
+# With spike_times_dtype=np.float32 they need half of the memory, at the cost of rounding the spike times.
+# With a pool_size k > 1 the k x k blocks of sensor pixels are pooled into one retina pixel (see EventPreprocessor),
+# so the crop window spans dim_x * k by dim_y * k sensor pixels. The disparities found by the network are then in
+# units of k sensor pixels (see the pool_size of CooperativeNetwork).
+# Bursts are filtered with a refractory_period (in ms) per pixel. With a hot_pixel_rate (in events per second) all
+# sensor pixels which fire faster on average are masked. The numbers of dropped events per retina and reason are
+# kept in the statistics (see print_statistics).
+# If a cache_dir is given, the preprocessed spike times are stored there, keyed by the content of the source and the
+# preprocessing parameters, and later runs with the same input memory-map them instead of reading the source again
+# (a url is still downloaded to hash its content, but not parsed and preprocessed).
 class ExternalInputReader():
     def __init__(self, url="",
                  file_path="",
@@ -15,124 +311,151 @@ class ExternalInputReader():
                  dim_x=1,
                  dim_y=1,
                  sim_time=1000,
-                 is_rawdata_time_in_ms=False):
+                 is_rawdata_time_in_ms=False,
+                 sim_time_begin=0,
+                 chunk_size=None,
+                 chunk_duration=None,
+                 spike_times_dtype=np.float64,
+                 cache_dir=None,
+                 decoder_params=None,
+                 pool_size=1,
+                 pool_rule='refractory',
+                 coincidence_events=2,
+                 coincidence_window=1.0,
+                 refractory_period=REFRACTORY_PERIOD,
+                 hot_pixel_rate=None):
         # these are the attributes which contain will contain the sorted, filtered and formatted spikes for each pixel
         self.retinaLeft = []
         self.retinaRight = []
+        self.pool_size = pool_size
+        # the numbers of events of each retina which have been dropped by the preprocessing (see STATISTICS_KEYS)
+        self.statistics = None
 
         if url is not "" and file_path is not "" or \
             url is "" and file_path is "":
             print("ERROR: Ambiguous or void input source address. Give either a URL or a local file path.")
             return
+        # a URL is read as a text recording, at once or in chunks, so other recordings have to be downloaded first
+        assert url is "" or url.endswith((".dat", ".dat.gz")), \
+            "ERROR: Only .dat and .dat.gz recordings can be read from a URL, download the other ones to a local file."
 
-        rawdata = None
-        eventList = []
-        # check the url or the file path, read the data file and pass it further down for processing.
-        if url is not "" and url[-4:] == ".dat":
-            # connect to website and parse text data
-            file = urllib.urlopen(url)
-            rawdata = file.read()
-            file.close()
-            # read the file line by line and extract the timestamp, x and y coordinates, polarity and retina ID.
-            # TODO: add a case for different files like the npz, which are read from other servers.
-            for e in rawdata.split('\n'):
-                if e != '':
-                    eventList.append([int(x) for x in e.split()])
-        elif file_path is not "" and file_path[-4:] == ".dat":
-            with open(file_path, 'r') as file:
+        cache_file = None
+        if cache_dir is not None:
+            parameters = {'crop': [crop_xmin, crop_ymin, crop_xmax, crop_ymax],
+                          'dim_x': dim_x,
+                          'dim_y': dim_y,
+                          'sim_time': sim_time,
+                          'sim_time_begin': sim_time_begin,
+                          'is_rawdata_time_in_ms': is_rawdata_time_in_ms,
+                          'refractory_period': refractory_period,
+                          'hot_pixel_rate': hot_pixel_rate,
+                          'dtype': np.dtype(spike_times_dtype).str,
+                          'decoder_params': decoder_params,
+                          'pooling': [pool_size, pool_rule, coincidence_events, coincidence_window]}
+            if file_path.endswith(CAMERA_EXTENSIONS):
+                parameters['camera_decoder'] = CAMERA_DECODER_VERSION
+            cache_file = os.path.join(cache_dir, "input_{0}.npz".format(_input_cache_key(url, file_path, parameters)))
+            if os.path.exists(cache_file):
+                # the archive is stored without compression, so the spike times are memory-mapped
+                cached = load_npz(cache_file)
+                self.retinaLeft, self.retinaRight = [PixelSpikeTimes(cached[side + "_times"], cached[side + "_offsets"],
+                                                                     dim_x, dim_y, pad_time=sim_time + 10)
+                                                     for side in ("left", "right")]
+                if "statistics" in cached:
+                    self.statistics = json.loads(np.asarray(cached["statistics"]).tostring().decode('utf-8'))
+                return
+
+        preprocessor = EventPreprocessor(dim_x=dim_x, dim_y=dim_y,
+                                         crop_xmin=crop_xmin, crop_ymin=crop_ymin,
+                                         crop_xmax=crop_xmax, crop_ymax=crop_ymax,
+                                         sim_time=sim_time, is_rawdata_time_in_ms=is_rawdata_time_in_ms,
+                                         sim_time_begin=sim_time_begin, spike_times_dtype=spike_times_dtype,
+                                         pool_size=pool_size, pool_rule=pool_rule,
+                                         coincidence_events=coincidence_events,
+                                         coincidence_window=coincidence_window,
+                                         refractory_period=refractory_period)
+
+        time_scale = 1 if is_rawdata_time_in_ms else 1000
+        window_begin, window_end = sim_time_begin * time_scale, (sim_time_begin + sim_time) * time_scale
+        # the .npz recordings are passed on with float64 timestamps, read at once or in chunks (event_io keeps the
+        # floating point timestamps of a .npz, so only integer ones are converted)
+        is_npz = file_path is not "" and file_path[-4:] == ".npz"
+        if chunk_size is not None or chunk_duration is not None:
+            def read_chunks():
+                source = urllib.urlopen(url) if url is not "" else file_path
+                if url.endswith(".gz"):
+                    source = GunzipStream(source)
+                for chunk in iter_events(source, chunk_size=chunk_size,
+                                         chunk_duration=chunk_duration * time_scale if chunk_duration else None,
+                                         decoder_params=decoder_params):
+                    if chunk[0, 0] > window_end:
+                        break
+                    chunk = chunk[window(chunk[:, 0], window_begin, window_end, include_end=True)]
+                    yield chunk.astype(np.float64, copy=False) if is_npz else chunk
+                if url is not "":
+                    source.close()
+
+            if hot_pixel_rate is not None:
+                # the event rates have to be known before the first chunk is filtered, so the recording is read twice
+                for chunk in read_chunks():
+                    preprocessor.count(chunk)
+                preprocessor.mask_hot_pixels(hot_pixel_rate)
+            for chunk in read_chunks():
+                preprocessor.process(chunk)
+        else:
+            # check the url or the file path, read the data file and pass it further down for processing.
+            events = None
+            if url is not "":
+                # connect to website and parse text data
+                file = urllib.urlopen(url)
                 rawdata = file.read()
                 file.close()
-            # read the file line by line and extract the timestamp, x and y coordinates, polarity and retina ID.
-            for e in rawdata.split('\n'):
-                if e != '':
-                    eventList.append([int(x) for x in e.split()])
-        elif file_path is not "" and file_path[-4:] == ".npz":
-            from numpy import load as load_npz_file
-            f = load_npz_file(file_path)
-            data_left = f["left"]
-            data_right = f["right"]
-            for t, x, y, p in data_left:
-                if is_rawdata_time_in_ms:
-                    if t > sim_time:
-                        break
-                else:
-                    if t > sim_time * 1000:
-                        break
-                eventList.append([float(t), int(x), int(y), int(p), 1])
-            for t, x, y, p in data_right:
-                if is_rawdata_time_in_ms:
-                    if t > sim_time:
-                        break
-                else:
-                    if t > sim_time * 1000:
-                        break
-                eventList.append([float(t), int(x), int(y), int(p), 0])
+                if url.endswith(".gz"):
+                    rawdata = zlib.decompress(rawdata, 16 + zlib.MAX_WBITS)
+                events = parse_dat(rawdata)
+                events = events[window(events[:, 0], window_begin, window_end, include_end=True)]
+            elif file_path is not "" and file_path.endswith((".dat", ".dat.gz")):
+                events = read_dat(file_path, window_begin, window_end, include_end=True)
+            elif file_path is not "" and file_path.endswith(CAMERA_EXTENSIONS):
+                events = read_camera_window(file_path, window_begin, window_end, include_end=True,
+                                            **(decoder_params or {}))
+            elif is_npz:
+                # NOTE: the "left" array is tagged with the retina ID 1 and the "right" one with 0 (see NPZ_RETINA_IDS)
+                data = read_npz(file_path, keys=("left", "right"), begin=window_begin, end=window_end,
+                                include_end=True)
+                events = np.concatenate(
+                    [np.column_stack((data[key][:, 0].astype(np.float64), data[key][:, 1:4],
+                                      np.full(len(data[key]), NPZ_RETINA_IDS[key])))
+                     for key in ("left", "right")])
+            if events is not None:
+                if hot_pixel_rate is not None:
+                    preprocessor.count(events)
+                    preprocessor.mask_hot_pixels(hot_pixel_rate)
+                preprocessor.process(events)
 
+        # store the formatted and filtered events which are to be passed to the retina constructors
+        self.retinaLeft, self.retinaRight = preprocessor.spike_times()
+        self.statistics = preprocessor.statistics
 
-        # initialise the maximum time constant as the total simulation duration. This is needed to set a value
-        # for pixels which don't spike at all, since the pyNN frontend requires so.
-        # If they spike at the last possible time step, their firing will have no effect on the simulation.
-        max_time = sim_time
-
-        # containers for the formatted spikes
-        # define as list of lists of lists so that SpikeSourceArrays don't complain
-        retinaL = [[[] for y in range(dim_y)] for x in range(dim_x)]
-        retinaR = [[[] for y in range(dim_y)] for x in range(dim_x)]
-
-        # last time a spike has occured for a pixel -- used to filter event bursts
-        last_tL = [[0.0]]
-        last_tR = [[0.0]]
-        for x in range(0, dim_x):
-            for y in range(0, dim_y):
-                last_tL[x].append(-1.0)
-                last_tR[x].append(-1.0)
-            last_tL.append([])
-            last_tR.append([])
-
-        # process each event in the event list and format the time and position. Distribute among the retinas respectively
-        for evt in eventList:
-            x = evt[1] - 1
-            y = evt[2] - 1
-            if not is_rawdata_time_in_ms:
-                t = evt[0] / 1000.0  # retina event time steps are in micro seconds, so convert to milliseconds
-            else:
-                t = evt[0]
-
-            # firstly, take events only from the within of a window centered at the retina view center,
-            # then sort the left and the right events.
-            if crop_xmax >= 0 and crop_xmin >= 0 and crop_ymax >= 0 and crop_ymin >= 0:
-                if crop_xmin <= x < crop_xmax and crop_ymin <= y < crop_ymax:
-                    if evt[4] == 1:
-                        # filter event bursts and limit the events to the maximum time for the simulation
-                        if t - last_tR[x - crop_xmin][y - crop_ymin] >= 1.0 and t <= max_time:
-                            # print "r", x, y, x-lowerBoundX, y-lowerBoundY
-                            retinaR[x - crop_xmin][y - crop_ymin].append(t)
-                            last_tR[x - crop_xmin][y - crop_ymin] = t
-                    elif evt[4] == 0:
-                        if t - last_tL[x - crop_xmin][y - crop_ymin] >= 1.0 and t <= max_time:
-                            # 				print "l", x, y, x-lowerBoundX, y-lowerBoundY
-                            retinaL[x - crop_xmin][y - crop_ymin].append(t)
-                            last_tL[x - crop_xmin][y - crop_ymin] = t
-            else:
-                if evt[4] == 1:
-                    # apply the same time filtering
-                    if t - last_tR[x][y] >= 1.0 and t <= max_time:
-                        retinaR[x][y].append(t)
-                        last_tR[x][y] = t
-                elif evt[4] == 0:
-                    if t - last_tL[x][y] >= 1.0 and t <= max_time:
-                        retinaL[x][y].append(t)
-                        last_tL[x][y] = t
-
-        # fill the void cells with the last time possible, which has no effect on the simulation. The SpikeSourceArray
-        # requires a value for each cell.
-        for y in range(0, dim_x):
-            for x in range(0, dim_y):
-                if retinaR[y][x] == []:
-                    retinaR[y][x].append(max_time + 10)
-                if retinaL[y][x] == []:
-                    retinaL[y][x].append(max_time + 10)
+        if cache_file is not None:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            # write to a temporary file first so that concurrent runs never see a partial cache entry
+            tmp_file = "{0}.{1}.tmp".format(cache_file, os.getpid())
+            with open(tmp_file, 'wb') as f:
+                np.savez(f, left_times=self.retinaLeft.times, left_offsets=self.retinaLeft.offsets,
+                         right_times=self.retinaRight.times, right_offsets=self.retinaRight.offsets,
+                         statistics=np.frombuffer(json.dumps(self.statistics).encode('utf-8'), dtype=np.uint8))
+            os.rename(tmp_file, cache_file)
 
-        # store the formatted and filtered events which are to be passed to the retina constructors
-        self.retinaLeft = retinaL
-        self.retinaRight = retinaR
+    def print_statistics(self):
+        if self.statistics is None:
+            print("WARNING: No preprocessing statistics available.")
+            return
+        for side in ("left", "right"):
+            stats = self.statistics[side]
+            print("INFO: {0} retina: {1} events within the simulation time, {2} accepted. Dropped {3} outside of the "
+                  "crop window, {4} from {5} hot pixels, {6} without coincidence and {7} within the refractory "
+                  "period.".format(side.capitalize(), stats['events'], stats['accepted'], stats['outside_view'],
+                                   stats['hot_pixel'], stats['hot_pixels'], stats['coincidence'],
+                                   stats['refractory']))
@@ -0,0 +1,53 @@
+import numpy as np
+
+# the resolution of the eDVS
+SENSOR_SIZE = 128
+# the maximum number of neurons of a SpikeInjector population
+MAX_INJNEURONS_IN_POPULATION = 255
+
+
+class InjectorMapping(object):
+    """
+    The mapping of the pixels of the sensor to the SpikeInjector neurons of a live Retina. The injector neurons are
+    packed densely: each population holds as many whole pixel columns (of dim_y pixels) as fit into
+    MAX_INJNEURONS_IN_POPULATION neurons. The retina is the dim_x x dim_y window at the centre of the sensor (or at
+    its corner without crop_window).
+    population[x, y] and neuron[x, y] give the population index and the neuron id for each sensor pixel, or -1 for
+    the pixels outside of the retina, so that the events of the DVSReader are mapped by a single gather.
+    """
+
+    def __init__(self, dim_x=1, dim_y=1, crop_window=True, sensor_size=SENSOR_SIZE,
+                 max_neurons_per_population=MAX_INJNEURONS_IN_POPULATION):
+        assert 0 < dim_x <= sensor_size and 0 < dim_y <= sensor_size, \
+            "ERROR: The retina of {0}x{1} pixels does not fit on the sensor.".format(dim_x, dim_y)
+        assert dim_y <= max_neurons_per_population, \
+            "ERROR: A pixel column of {0} pixels does not fit into one injector population.".format(dim_y)
+        self.dim_x = dim_x
+        self.dim_y = dim_y
+        if crop_window:
+            self.lower_x, self.lower_y = (sensor_size - dim_x) / 2, (sensor_size - dim_y) / 2
+        else:
+            self.lower_x, self.lower_y = 0, 0
+        self.columns_per_population = max_neurons_per_population / dim_y
+        n_populations = (dim_x - 1) / self.columns_per_population + 1
+        self.population_sizes = [min(self.columns_per_population, dim_x - i * self.columns_per_population) * dim_y
+                                 for i in range(0, n_populations)]
+
+        self.population = np.full((sensor_size, sensor_size), -1, dtype=np.int64)
+        self.neuron = np.full((sensor_size, sensor_size), -1, dtype=np.int64)
+        x, y = np.meshgrid(np.arange(dim_x), np.arange(dim_y), indexing='ij')
+        window = (slice(self.lower_x, self.lower_x + dim_x), slice(self.lower_y, self.lower_y + dim_y))
+        self.population[window] = x / self.columns_per_population
+        self.neuron[window] = y + (x % self.columns_per_population) * dim_y
+
+    def __len__(self):
+        return len(self.population_sizes)
+
+    def labels(self, label):
+        """the labels of the injector populations of the retina with the given label."""
+        return ["{0}_{1}".format(label, i) for i in range(0, len(self.population_sizes))]
+
+    def lookup(self, x, y):
+        """the population indices and neuron ids of the events at the sensor pixels x, y (-1 outside of the
+        retina)."""
+        return self.population[x, y], self.neuron[x, y]
@@ -1,29 +1,110 @@
 from threading import Thread
+import numpy as np
 import time
-import serial as ser
+
+from injector_mapping import InjectorMapping
+
+# the first byte of each event word of the eDVS has the sync bit set and holds x (7 bits), the second byte holds the
+# polarity (bit 7) and y (7 bits). In the timestamped modes (see DVSReader) the words are followed by a big-endian
+# timestamp (in microseconds) of TIMESTAMP_MODES[mode] bytes.
+SYNC_BIT = 0x80
+TIMESTAMP_MODES = {0: 0, 2: 2, 3: 3, 4: 4}
+
+
+def _word_starts(data, word_size):
+    # the start indices of the complete words of word_size bytes, the number of consumed bytes and the number of
+    # skipped bytes, see decode_event_words
+    n = len(data)
+    is_sync = (data & SYNC_BIT) != 0
+    if is_sync[0:n:word_size].all():
+        # the usual case: the stream is in sync, every word_size-th byte starts a word
+        visited = np.arange(0, n, word_size)
+    else:
+        # follow the words from the first byte: a sync byte is followed by the next word word_size bytes later, any
+        # other byte by the next candidate 1 byte later. The visited bytes are found with pointer doubling.
+        index = np.arange(n)
+        jump = np.r_[np.minimum(np.where(is_sync, index + word_size, index + 1), n), n]
+        reached = np.zeros(n + 1, dtype=bool)
+        reached[0] = True
+        while True:
+            newly = np.zeros(n + 1, dtype=bool)
+            newly[jump[reached]] = True
+            newly &= ~reached
+            if not newly[:n].any():
+                break
+            reached |= newly
+            jump = jump[jump]
+        visited = np.flatnonzero(reached[:n])
+    # a sync byte within the last word_size - 1 positions is the beginning of a word which is completed by the next
+    # read
+    pending = n > 0 and visited[-1] > n - word_size and is_sync[visited[-1]]
+    starts = visited[is_sync[visited] & (visited <= n - word_size)]
+    skipped = int((~is_sync[visited]).sum())
+    return starts, visited[-1] if pending else n, skipped
+
+
+def decode_event_words(data):
+    """
+    Decodes all complete 2 byte event words of a byte buffer at once. A word starts at a byte with the sync bit,
+    bytes without it are skipped one at a time until the stream is in sync again. Returns the arrays x, y, p, the
+    number of consumed bytes (a trailing incomplete word is left over for the next read) and the number of skipped
+    bytes.
+    """
+    data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data
+    starts, consumed, skipped = _word_starts(data, 2)
+    x = data[starts] & 0x7f
+    y = data[starts + 1] & 0x7f
+    p = data[starts + 1] >> 7
+    return x, y, p, consumed, skipped
+
+
+def decode_timestamped_words(data, timestamp_bytes):
+    """
+    Decodes all complete event words with a timestamp of timestamp_bytes bytes (see decode_event_words). Returns
+    the arrays x, y, p, t (the raw timestamps, which wrap around after 8 * timestamp_bytes bits), the number of
+    consumed bytes and the number of skipped bytes.
+    """
+    data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data
+    starts, consumed, skipped = _word_starts(data, 2 + timestamp_bytes)
+    x = data[starts] & 0x7f
+    y = data[starts + 1] & 0x7f
+    p = data[starts + 1] >> 7
+    t = np.zeros(len(starts), dtype=np.int64)
+    for i in range(0, timestamp_bytes):
+        t = (t << 8) | data[starts + 2 + i]
+    return x, y, p, t, consumed, skipped
+
+
+def unwrap_timestamps(t, last, wraps, timestamp_bytes):
+    """
+    Continues the raw timestamps t of a device after the last timestamp of the previous read, which have wrapped
+    around wraps times, i.e. counts a wrap around whenever a timestamp is smaller than its predecessor. Returns the
+    continued timestamps and the new last and wraps. Pauses of the events longer than a wrap around period can not be
+    noticed.
+    """
+    if len(t) == 0:
+        return t, last, wraps
+    wrapped = np.diff(np.r_[last if last is not None else t[0], t]) < 0
+    periods = wraps + np.cumsum(wrapped)
+    return t + (periods << (8 * timestamp_bytes)), int(t[-1]), int(periods[-1])
+
 
 class DVSReader(Thread):
     def __init__(self, address='/dev/ttyUSB', port=0, baudrate=4000000, buflen=64, label=None,
                  crop_window=True, dim_x=1, dim_y=1,
-                 live_connection=None):
+                 live_connection=None, read_size=1 << 16, flush_interval=0.001, max_batch_size=1024, mapping=None,
+                 timestamp_mode=0):
         Thread.__init__(self)
+        assert timestamp_mode in TIMESTAMP_MODES, \
+            "ERROR: The timestamp mode {0} is not supported (only {1}).".format(timestamp_mode,
+                                                                              sorted(TIMESTAMP_MODES))
 
         self.dim_x = dim_x
         self.dim_y = dim_y
 
-        if crop_window:
-            self.lowerBoundX = (128 - dim_x) / 2
-            self.upperBoundX = (128 + dim_x) / 2
-
-            self.lowerBoundY = (128 - dim_y) / 2
-            self.upperBoundY = (128 + dim_y) / 2
-        else:
-            # or should it be 1 and 128 ??
-            self.lowerBoundX = 0
-            self.upperBoundX = 127
-
-            self.lowerBoundY = 0
-            self.upperBoundY = 127
+        # the sensor pixels are mapped to the injector populations and neurons of the retina by a lookup table
+        self.mapping = mapping if mapping is not None else InjectorMapping(dim_x=dim_x, dim_y=dim_y,
+                                                                           crop_window=crop_window)
 
         self.live_connection = live_connection
         self.label = label
@@ -35,58 +116,178 @@ class DVSReader(Thread):
         self.evind = 0
         self.port = port
 
+        # the bytes are read into a reusable buffer, the beginning of which holds an incomplete word of the last read
+        self._buffer = bytearray(read_size)
+        self._pending = 0
+
+        # With a timestamp_mode of 2, 3 or 4 the eDVS sends each event with a timestamp of as many bytes (the modes
+        # !E2, !E3 and !E4 of the eDVS, a 2 byte timestamp wraps around every 65 ms). The timestamps are unwrapped and
+        # mapped to the host clock with clock_offset, the smallest difference between the time of a read and the
+        # timestamp of its last event seen so far. Without timestamps the events get the time of their read.
+        self.timestamp_mode = timestamp_mode
+        self.clock_offset = None
+        self._last_timestamp = None
+        self._wraps = 0
+        # the StereoSynchroniser which merges the events of this and the other reader by time, if any
+        self.synchroniser = None
+        # the number of reads, received bytes, decoded events, bytes skipped to resynchronise, events which are
+        # outside of the crop window or filtered as bursts, events sent to the live connection and packets (i.e.
+        # send_spikes calls) they have been sent in
+        self.stats = dict((key, 0) for key in ('reads', 'bytes', 'events', 'skipped_bytes', 'filtered', 'sent',
+                                               'packets'))
+        self._start_time = None
+
+        # the accepted events are collected and sent with one send_spikes call per injector population when the port
+        # has no more data waiting, but at least every flush_interval seconds or every max_batch_size events
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+
         self.stop = False
         self.start_injecting = False
         self.alive = True
         self.setDaemon(True)
 
-        self.dvsdev = ser.serial_for_url(address + str(port), baudrate, rtscts=True, dsrdtr=True, timeout=1)
+        self.open_device(address, port, baudrate)
         self.dvs_init()
 
+    def open_device(self, address, port, baudrate):
+        # pyserial is imported here such that the network package can be used without it
+        import serial as ser
+        self.dvsdev = ser.serial_for_url(address + str(port), baudrate, rtscts=True, dsrdtr=True, timeout=1)
+
     def dvs_init(self):
         self.dvsdev.write("R\n")
         time.sleep(0.1)
         self.dvsdev.write("1\n")  # LEDs on
-        self.dvsdev.write("!E0\n")  # no timestamps
+        self.dvsdev.write("!E{0}\n".format(self.timestamp_mode))  # no timestamps with mode 0
         self.dvsdev.write("E+\n")  # enable event streaming
 
     def dvs_close(self):
         self.dvsdev.write("0\n")  # LED off
         self.dvsdev.write("E-\n")  # event streaming off
 
+    def read_events(self, block=True):
+        """reads all bytes which are available (with block set at least one word, waiting up to the timeout of the
+        port) into the reusable buffer and decodes the complete event words at once. Returns the arrays x, y, p and
+        the times t of the events on the host clock (in seconds, see timestamp_mode)."""
+        pending = self._pending
+        timestamp_bytes = TIMESTAMP_MODES[self.timestamp_mode]
+        n_requested = self.dvsdev.in_waiting
+        if block:
+            n_requested = max(n_requested, 2 + timestamp_bytes - pending)
+        n_requested = min(n_requested, len(self._buffer) - pending)
+        data = self.dvsdev.read(n_requested)
+        read_time = time.time()
+        n = pending + len(data)
+        self._buffer[pending:n] = data
+        words = np.frombuffer(self._buffer, dtype=np.uint8, count=n)
+        if timestamp_bytes:
+            x, y, p, t, consumed, skipped = decode_timestamped_words(words, timestamp_bytes)
+            t, self._last_timestamp, self._wraps = unwrap_timestamps(t, self._last_timestamp, self._wraps,
+                                                                     timestamp_bytes)
+            t = t / 1000000.0
+            if len(t):
+                offset = read_time - t[-1]
+                self.clock_offset = offset if self.clock_offset is None else min(self.clock_offset, offset)
+                t += self.clock_offset
+        else:
+            x, y, p, consumed, skipped = decode_event_words(words)
+            t = np.full(len(x), read_time)
+        # keep an incomplete word for the next read
+        self._buffer[0:n - consumed] = self._buffer[consumed:n]
+        self._pending = n - consumed
+        self.stats['reads'] += 1
+        self.stats['bytes'] += len(data)
+        self.stats['events'] += len(x)
+        self.stats['skipped_bytes'] += skipped
+        return x, y, p, t
+
+    def flush(self, injector_ids, neuron_ids):
+        """sends the collected spikes with one send_spikes call for each injector population."""
+        injector_ids = np.concatenate(injector_ids)
+        neuron_ids = np.concatenate(neuron_ids)
+        order = np.argsort(injector_ids, kind='mergesort')
+        injector_ids, neuron_ids = injector_ids[order], neuron_ids[order]
+        bounds = np.flatnonzero(np.r_[True, injector_ids[1:] != injector_ids[:-1], True])
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            self.live_connection.send_spikes(label="{0}_{1}".format(self.label, injector_ids[begin]),
+                                             neuron_ids=neuron_ids[begin:end].tolist(),
+                                             send_full_keys=False)
+        self.stats['packets'] += len(bounds) - 1
+        self.stats['sent'] += len(neuron_ids)
+
+    def get_rates(self):
+        """the packets and events per second which have been sent since the reader has been started."""
+        duration = time.time() - self._start_time if self._start_time is not None else 0.0
+        if duration <= 0.0:
+            return {'packets': 0.0, 'events': 0.0}
+        return {'packets': self.stats['packets'] / duration, 'events': self.stats['sent'] / duration}
+
+    def print_statistics(self):
+        rates = self.get_rates()
+        print("INFO: {0}: {1} events decoded, {2} filtered, {3} sent in {4} packets ({5:.0f} events/s, "
+              "{6:.0f} packets/s), {7} bytes skipped.".format(self.label, self.stats['events'], self.stats['filtered'],
+                                                              self.stats['sent'], self.stats['packets'],
+                                                              rates['events'], rates['packets'],
+                                                              self.stats['skipped_bytes']))
+
+    def more_data_waiting(self):
+        # whether the port holds the rest of at least one more complete word
+        return self.dvsdev.in_waiting >= 2 + TIMESTAMP_MODES[self.timestamp_mode] - self._pending
+
+    def inject(self):
+        """reads events until the reader is stopped and sends the accepted ones to the live connection (or hands them
+        over to the synchroniser)."""
+        lastx = -1
+        lasty = -1
+
+        # the collected injector population and neuron ids and event times, their number and the time of the oldest
+        batch_injector_ids, batch_neuron_ids, batch_times, batch_size, batch_begin = [], [], [], 0, None
+        self._start_time = time.time()
+        while not self.stop:
+            # block only if there are no events waiting to be sent
+            idle = batch_size == 0 and (self.synchroniser is None or self.synchroniser.empty())
+            x, y, p, t = self.read_events(block=idle)
+            if self.start_injecting and len(x):
+                injector_ids, neuron_ids = self.mapping.lookup(x, y)
+                selected = injector_ids >= 0
+                x, y, t = x[selected], y[selected], t[selected]
+                injector_ids, neuron_ids = injector_ids[selected], neuron_ids[selected]
+                # filter naively event bursts (i.e. assume very low probability of the same pixel spiking next)
+                repeated = (x == np.r_[lastx, x[:-1]]) & (y == np.r_[lasty, y[:-1]])
+                self.stats['filtered'] += int((~selected).sum() + repeated.sum())
+                if len(x):
+                    lastx, lasty = x[-1], y[-1]
+                if (~repeated).any():
+                    batch_injector_ids.append(injector_ids[~repeated])
+                    batch_neuron_ids.append(neuron_ids[~repeated])
+                    batch_times.append(t[~repeated])
+                    if batch_size == 0:
+                        batch_begin = time.time()
+                    batch_size += int((~repeated).sum())
+            if batch_size > 0 and (not self.more_data_waiting() or batch_size >= self.max_batch_size or
+                                   time.time() - batch_begin >= self.flush_interval):
+                self.send(batch_injector_ids, batch_neuron_ids, batch_times)
+                batch_injector_ids, batch_neuron_ids, batch_times, batch_size = [], [], [], 0
+            elif self.synchroniser is not None:
+                self.synchroniser.release()
+        if batch_size > 0:
+            self.send(batch_injector_ids, batch_neuron_ids, batch_times)
+        if self.synchroniser is not None:
+            self.synchroniser.close(self)
+
+    def send(self, injector_ids, neuron_ids, times):
+        # the batch is either sent right away or merged with the events of the other reader
+        if self.synchroniser is None:
+            self.flush(injector_ids, neuron_ids)
+        else:
+            self.synchroniser.push(self, np.concatenate(injector_ids), np.concatenate(neuron_ids),
+                                   np.concatenate(times))
+
     def run(self):
         """read and interpret data from serial port"""
-        MAX_INJNEURONS_IN_POPULATION = 255
         try:
-            lastx = -1
-            lasty = -1
-
-            n_pixel_cols_per_injector_pop = MAX_INJNEURONS_IN_POPULATION / self.dim_y
-
-            while not self.stop:
-                # self.bufbytes = self.dvsdev.inWaiting()
-                data = bytearray(self.dvsdev.read(2))
-                if (data[0] & 0x80) != 0:
-                    x = data[0] & 0x7f
-                    y = data[1] & 0x7f
-                    p = data[1] >> 7
-
-                    if self.lowerBoundX <= x < self.upperBoundX \
-                            and self.lowerBoundY <= y < self.upperBoundY \
-                            and self.start_injecting:
-                        # filter naively event bursts (i.e. assume very low probability of the same pixel spiking next)
-                        if x != lastx or y != lasty:
-                            # normalize pixel coordinates and send spike in the corresponding population and neuron within it
-                            injector_label = (x - self.lowerBoundX) / n_pixel_cols_per_injector_pop
-                            injectorNeuronID = (y - self.lowerBoundY) \
-                                               + ((x - self.lowerBoundX) % n_pixel_cols_per_injector_pop) * self.dim_y
-                            self.live_connection.send_spike(label="{0}_{1}".format(self.label, injector_label),
-                                                            neuron_id=injectorNeuronID,
-                                                            send_full_keys=False)
-                            lastx = x
-                            lasty = y
-                else:
-                    self.dvsdev.read(1)
+            self.inject()
             self.dvs_close()
             self.start_injecting = False
 
@@ -0,0 +1,87 @@
+import numpy as np
+import multiprocessing
+
+from simulation import SNNSimulation
+from retina import Retina
+from cooperative_net import CooperativeNetwork, SPIKES_DTYPE
+from pixel_spike_times import PixelSpikeTimes
+
+
+def stripe_bounds(dim_y, n_stripes, halo):
+    """splits the rows 0..dim_y-1 into n_stripes horizontal stripes of (almost) equal height. Each stripe is
+    returned as (start, stop, core_start, core_stop), where [core_start, core_stop) are the rows the stripe is
+    responsible for and [start, stop) additionally contains up to halo rows on each side."""
+    assert 0 < n_stripes <= dim_y, "ERROR: Cannot split {0} rows into {1} stripes.".format(dim_y, n_stripes)
+    edges = np.linspace(0, dim_y, n_stripes + 1).round().astype(int)
+    return [(max(0, core_start - halo), min(dim_y, core_stop + halo), core_start, core_stop)
+            for core_start, core_stop in zip(edges[:-1], edges[1:])]
+
+
+def _run_stripe(args):
+    """runs the network of one stripe and returns its decoded spikes in the coordinates of the whole scene,
+    without the spikes of the halo rows. It is a module level function so that it can be sent to a worker."""
+    (left, right, dim_x, bounds, max_disparity, simulation_time, simulation_time_step,
+     cell_params, experiment_name, backend, backend_params, network_params) = args
+    start, stop, core_start, core_stop = bounds
+    simulation = SNNSimulation(simulation_time=simulation_time, simulation_time_step=simulation_time_step,
+                               backend=backend, **backend_params)
+    label = "{0}_rows_{1}_{2}".format(experiment_name, start, stop)
+    left, right = [spike_times.select_rows(start, stop) if isinstance(spike_times, PixelSpikeTimes)
+                   else [column[start:stop] for column in spike_times] for spike_times in (left, right)]
+    retinae = {'left': Retina(label="RetL", dimension_x=dim_x, dimension_y=stop - start,
+                              spike_times=left, experiment_name=label),
+               'right': Retina(label="RetR", dimension_x=dim_x, dimension_y=stop - start,
+                               spike_times=right, experiment_name=label)}
+    network = CooperativeNetwork(retinae=retinae, max_disparity=max_disparity, cell_params=cell_params,
+                                 experiment_name=label, verbose=False, **network_params)
+    simulation.run()
+    spikes = network.get_spikes(sort_by_time=False, save_spikes=False)
+    simulation.end()
+    # the decoded y coordinates are 1-indexed within the stripe
+    spikes['y'] += start
+    return spikes[(spikes['y'] > core_start) & (spikes['y'] <= core_stop)]
+
+
+class StripedSimulation(object):
+    """
+    Runs one scene as several independent simulations of horizontal stripes of rows. Within a cooperative network
+    the inhibition acts only along the projective lines of the same row and the rows are coupled only by the
+    excitation of radius_e, therefore each stripe is extended by halo rows (radius_e by default) on both sides.
+    The spikes of the halo rows are dropped when the results are stitched together. Note that the halo rows miss
+    the coupling to the rows beyond them, so near the stripe borders the result can differ slightly from the one
+    of a single network.
+    The stripes are simulated in separate processes (cpu backend by default). The stimulus is either an
+    ExternalInputReader or a (left, right) tuple of per pixel spike times (PixelSpikeTimes or nested lists
+    indexed as spike_times[x][y]).
+    """
+
+    def __init__(self, stimulus, dim_x=1, dim_y=1, max_disparity=0, n_stripes=2, halo=None,
+                 simulation_time=1000, simulation_time_step=0.2, cell_params=None, experiment_name="Striped",
+                 backend='cpu', n_processes=None, backend_params=None, **network_params):
+        if hasattr(stimulus, 'retinaLeft'):
+            stimulus = (stimulus.retinaLeft, stimulus.retinaRight)
+        if halo is None:
+            # the default cell parameters of the CooperativeNetwork have a radius of excitation of 1
+            halo = cell_params['topological']['radius_e'] if cell_params is not None else 1
+        self.stripes = stripe_bounds(dim_y, n_stripes, halo)
+        self.n_processes = min(n_stripes, multiprocessing.cpu_count()) if n_processes is None else n_processes
+        self._jobs = [(stimulus[0], stimulus[1], dim_x, bounds, max_disparity, simulation_time,
+                       simulation_time_step, cell_params, experiment_name, backend,
+                       backend_params if backend_params is not None else dict(), network_params)
+                      for bounds in self.stripes]
+
+    def run(self, sort_by_time=True):
+        """runs all stripes and returns the stitched spikes of the whole scene (see CooperativeNetwork.get_spikes)."""
+        if self.n_processes > 1:
+            pool = multiprocessing.Pool(processes=self.n_processes)
+            try:
+                results = pool.map(_run_stripe, self._jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_run_stripe(job) for job in self._jobs]
+        spikes = np.concatenate(results) if results else np.zeros(0, dtype=SPIKES_DTYPE)
+        if sort_by_time:
+            spikes = spikes[np.argsort(spikes['t'], kind='mergesort')]
+        return spikes
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class PixelSpikeTimes(object):
+    """
+    Compact (CSR-like) container of the spike times of each pixel of a retina. All spike times are stored in one
+    flat array, sorted by pixel and time, where pixel p = x * dim_y + y owns times[offsets[p]:offsets[p + 1]].
+    Indexing with [x] gives a column and [x][y] a read-only view of the spike times of one pixel, so the container
+    can be used wherever the nested lists of spike times (spike_times[x][y]) have been used before.
+    Pixels without spikes are empty. Backends which require at least one spike per SpikeSourceArray neuron get the
+    pad_time instead (see column), which is after the end of the simulation and thus has no effect.
+    """
+
+    def __init__(self, times, offsets, dim_x=1, dim_y=1, pad_time=None):
+        assert len(offsets) == dim_x * dim_y + 1, \
+            "ERROR: Expected {0} offsets for {1}x{2} pixels.".format(dim_x * dim_y + 1, dim_x, dim_y)
+        self.times = np.asarray(times)
+        self.times.setflags(write=False)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.dim_x = dim_x
+        self.dim_y = dim_y
+        self.pad_time = pad_time
+        self._keys = None
+
+    @classmethod
+    def from_events(cls, pixels, times, dim_x=1, dim_y=1, pad_time=None, dtype=np.float64):
+        """builds the container from the pixel ids and times of the spikes, which have to be sorted by time
+        within each pixel."""
+        order = np.argsort(pixels, kind='mergesort')
+        pixels = np.asarray(pixels, dtype=np.int64)[order]
+        offsets = np.searchsorted(pixels, np.arange(dim_x * dim_y + 1))
+        return cls(np.asarray(times, dtype=dtype)[order], offsets, dim_x, dim_y, pad_time)
+
+    @classmethod
+    def from_lists(cls, spike_times, dtype=np.float64):
+        """converts nested lists of spike times (indexed by [x][y]) into the container."""
+        dim_x, dim_y = len(spike_times), len(spike_times[0])
+        lengths = [len(spike_times[x][y]) for x in range(dim_x) for y in range(dim_y)]
+        offsets = np.zeros(dim_x * dim_y + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        times = np.concatenate([np.asarray(spike_times[x][y], dtype=dtype).ravel()
+                                for x in range(dim_x) for y in range(dim_y)] + [np.zeros(0, dtype=dtype)])
+        return cls(times, offsets, dim_x, dim_y)
+
+    def __len__(self):
+        return self.dim_x
+
+    def __getitem__(self, x):
+        if not -self.dim_x <= x < self.dim_x:
+            raise IndexError("pixel column {0} is out of range".format(x))
+        return self.column(x % self.dim_x)
+
+    def pixel(self, x, y):
+        p = x * self.dim_y + y
+        return self.times[self.offsets[p]:self.offsets[p + 1]]
+
+    def column(self, x, pad=False):
+        """the spike times of the pixels of column x as a list of array views. With pad set, empty pixels get the
+        pad_time as their only spike."""
+        column = [self.pixel(x, y) for y in range(0, self.dim_y)]
+        if pad:
+            padding = np.array([self.pad_time], dtype=self.times.dtype)
+            column = [times if len(times) else padding for times in column]
+        return column
+
+    def select_rows(self, start, stop):
+        """a container with only the rows start..stop-1 of each column (e.g. for partitioning a retina)."""
+        pixels = (np.arange(self.dim_x)[:, None] * self.dim_y + np.arange(start, stop)[None, :]).ravel()
+        lengths = self.offsets[pixels + 1] - self.offsets[pixels]
+        offsets = np.zeros(len(pixels) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        selected = np.repeat(self.offsets[pixels], lengths) + np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+        return PixelSpikeTimes(self.times[selected], offsets, self.dim_x, stop - start, self.pad_time)
+
+    def select_times(self, begin, end):
+        """a container with only the spike times within [begin, end) of each pixel (e.g. for one time slice of a
+        segmented run). The spikes are found by binary search, so the cost depends on the number of pixels and of
+        the selected spikes only."""
+        if self._keys is None:
+            # complex numbers are ordered by their real and then by their imaginary part, i.e. by pixel and time
+            self._keys = np.repeat(np.arange(self.dim_x * self.dim_y), np.diff(self.offsets)) + 1j * self.times
+        pixels = np.arange(self.dim_x * self.dim_y)
+        starts = np.searchsorted(self._keys, pixels + 1j * begin, side='left')
+        stops = np.searchsorted(self._keys, pixels + 1j * end, side='left')
+        lengths = stops - starts
+        offsets = np.zeros(len(pixels) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        selected = np.repeat(starts, lengths) + np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+        return PixelSpikeTimes(self.times[selected], offsets, self.dim_x, self.dim_y, self.pad_time)
+
+    def to_lists(self, pad=True):
+        """the spike times as nested lists (indexed by [x][y]) as used by the older versions. With pad set, empty
+        pixels get the pad_time as their only spike."""
+        times = self.times.tolist()
+        lists = [[times[self.offsets[x * self.dim_y + y]:self.offsets[x * self.dim_y + y + 1]]
+                  for y in range(0, self.dim_y)] for x in range(0, self.dim_x)]
+        if pad:
+            for column in lists:
+                for pixel in column:
+                    if not pixel:
+                        pixel.append(self.pad_time)
+        return lists
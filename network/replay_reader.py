@@ -0,0 +1,195 @@
+import time
+from threading import Lock
+import numpy as np
+
+from live_dvs_reader import DVSReader
+from event_io import iter_events
+from injector_mapping import SENSOR_SIZE
+
+
+class LocalLiveSpikesConnection(object):
+    """
+    Stands in for the SpynnakerLiveSpikesConnection of the live retinas when no simulation is running. It has the
+    same send_spike, send_spikes and add_start_callback methods, counts the sent spikes and packets and, with
+    record set, keeps the (time, label, neuron_ids) of each packet. start calls the start callbacks, as the
+    connection does when the simulation starts. It can be shared by several readers.
+    """
+
+    def __init__(self, record=False):
+        self.record = record
+        self.packets = []
+        self.n_spikes = 0
+        self.n_packets = 0
+        self._start_callbacks = []
+        self._lock = Lock()
+
+    def add_start_callback(self, label, start_callback):
+        self._start_callbacks.append((label, start_callback))
+
+    def start(self):
+        for label, start_callback in self._start_callbacks:
+            start_callback()
+
+    def send_spike(self, label, neuron_id, send_full_keys=False):
+        self.send_spikes(label, [neuron_id], send_full_keys=send_full_keys)
+
+    def send_spikes(self, label, neuron_ids, send_full_keys=False):
+        with self._lock:
+            self.n_spikes += len(neuron_ids)
+            self.n_packets += 1
+            if self.record:
+                self.packets.append((time.time(), label, list(neuron_ids)))
+
+    def received_spikes(self):
+        """the recorded spikes as a list of (label, neuron_id), in the order they have been sent."""
+        return [(label, n) for _, label, neuron_ids in self.packets for n in neuron_ids]
+
+    def close(self):
+        pass
+
+
+class ReplayReader(DVSReader):
+    """
+    Replays the events of one retina of a recording (.dat, .npz, camera or binary, see event_io.iter_events) through
+    the live injection path of the DVSReader, i.e. with the same pixel mapping, burst filter and batching, but
+    without a camera. The recorded pixel coordinates are 1-based sensor coordinates, the retina ids are 0 for the
+    left and 1 for the right camera (as for ExternalInputReader).
+    The inter-event timing of the recording is kept, scaled by speed (2.0 replays twice as fast), or the events are
+    sent as fast as possible with speed None. The replay starts when start_injecting is set, at which time the
+    recorded time_origin is due (with the default 0 and the same origin for both retinas their events stay aligned;
+    None starts with the first event of the retina). The reader stops when the recording has been replayed
+    (finished is set then).
+    Besides the statistics of the DVSReader, stats holds the number of flushed batches and the latency of the oldest
+    event of each batch behind its scheduled time (the sum and the maximum, in seconds).
+    """
+
+    def __init__(self, source, retina=0, label=None, crop_window=True, dim_x=1, dim_y=1, live_connection=None,
+                 speed=1.0, time_origin=0, is_rawdata_time_in_ms=False, read_size=1 << 16, flush_interval=0.001,
+                 max_batch_size=1024, mapping=None):
+        assert speed is None or speed > 0, "ERROR: The replay speed must be positive (or None)."
+        self.source = source
+        self.retina = retina
+        self.speed = speed
+        # the recorded timestamps per second
+        self.time_scale = 1000.0 if is_rawdata_time_in_ms else 1000000.0
+        self.read_size = read_size
+        self.finished = False
+
+        # the events of the current chunk of the recording, the index of the next one and the time of the first one
+        self._chunks = None
+        self._t = self._x = self._y = self._p = np.zeros(0, dtype=np.int64)
+        self._next = 0
+        self._first_time = time_origin
+        self._replay_start = None
+        # the scheduled time of the oldest event read since the last flush
+        self._batch_due = None
+
+        # the parameters of the serial port are not used
+        DVSReader.__init__(self, label=label, crop_window=crop_window, dim_x=dim_x, dim_y=dim_y,
+                           live_connection=live_connection, read_size=0, flush_interval=flush_interval,
+                           max_batch_size=max_batch_size, mapping=mapping)
+        self.stats.update({'batches': 0, 'latency': 0.0, 'max_latency': 0.0})
+
+    def open_device(self, address, port, baudrate):
+        pass
+
+    def dvs_init(self):
+        pass
+
+    def dvs_close(self):
+        pass
+
+    def _load_chunk(self):
+        # the next chunk with events of the replayed retina, or False at the end of the recording
+        if self._chunks is None:
+            self._chunks = iter_events(self.source, block_rows=self.read_size)
+        for events in self._chunks:
+            events = events[events[:, 4] == self.retina]
+            if len(events):
+                # (the events of .npz recordings with floating point timestamps are float arrays)
+                self._t = events[:, 0]
+                self._x, self._y = events[:, 1].astype(np.int64) - 1, events[:, 2].astype(np.int64) - 1
+                self._p = events[:, 3].astype(np.int64)
+                self._next = 0
+                return True
+        return False
+
+    def _scheduled_time(self, t):
+        return self._replay_start + (t - self._first_time) / (self.time_scale * self.speed)
+
+    def more_data_waiting(self):
+        if self._next >= len(self._t):
+            return False
+        return self.speed is None or self._scheduled_time(self._t[self._next]) <= time.time()
+
+    def read_events(self, block=True):
+        """returns the arrays x, y, p of the events which are due (with block set waiting for the next one, up to
+        0.1 s), at most read_size events, and their scheduled times t on the host clock (the current time with speed
+        None). Nothing is returned before start_injecting is set."""
+        empty = np.zeros(0, dtype=np.int64)
+        if not self.start_injecting:
+            if block:
+                time.sleep(0.001)
+            return empty, empty, empty, np.zeros(0)
+        if self._next >= len(self._t) and not self._load_chunk():
+            self.finished = True
+            self.stop = True
+            return empty, empty, empty, np.zeros(0)
+        if self._replay_start is None:
+            self._replay_start = time.time()
+            if self._first_time is None:
+                self._first_time = self._t[0]
+
+        begin = self._next
+        if self.speed is None:
+            end = min(begin + self.read_size, len(self._t))
+            t = np.full(end - begin, time.time())
+        else:
+            now = time.time()
+            due = self._first_time + (now - self._replay_start) * self.time_scale * self.speed
+            end = min(np.searchsorted(self._t, due, side='right'), begin + self.read_size)
+            if end == begin:
+                if block:
+                    time.sleep(min(self._scheduled_time(self._t[begin]) - now, 0.1))
+                return empty, empty, empty, np.zeros(0)
+            t = self._scheduled_time(self._t[begin:end])
+        self._next = end
+
+        x, y, p = self._x[begin:end], self._y[begin:end], self._p[begin:end]
+        # drop the events outside of the sensor, which the mapping can not look up
+        on_sensor = (0 <= x) & (x < SENSOR_SIZE) & (0 <= y) & (y < SENSOR_SIZE)
+        self.stats['reads'] += 1
+        self.stats['events'] += end - begin
+        self.stats['filtered'] += int((~on_sensor).sum())
+        x, y, p, t = x[on_sensor], y[on_sensor], p[on_sensor], t[on_sensor]
+        # the latency of a batch is measured from its oldest event which is sent, i.e. which lies within the retina
+        if self.speed is not None and self._batch_due is None:
+            in_retina = np.flatnonzero(self.mapping.population[x, y] >= 0)
+            if len(in_retina):
+                self._batch_due = t[in_retina[0]]
+        return x, y, p, t
+
+    def flush(self, injector_ids, neuron_ids):
+        DVSReader.flush(self, injector_ids, neuron_ids)
+        self.stats['batches'] += 1
+        if self._batch_due is not None:
+            latency = max(time.time() - self._batch_due, 0.0)
+            self.stats['latency'] += latency
+            self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+            self._batch_due = None
+
+    def print_statistics(self):
+        rates = self.get_rates()
+        print("INFO: {0}: {1} events replayed, {2} filtered, {3} sent in {4} packets ({5:.0f} events/s, "
+              "{6:.0f} packets/s).".format(self.label, self.stats['events'], self.stats['filtered'],
+                                           self.stats['sent'], self.stats['packets'],
+                                           rates['events'], rates['packets']))
+        if self.speed is not None and self.stats['batches'] > 0:
+            print("INFO: {0}: batch latency {1:.2f} ms on average, {2:.2f} ms at most.".format(
+                self.label, 1000.0 * self.stats['latency'] / self.stats['batches'],
+                1000.0 * self.stats['max_latency']))
+
+    def run(self):
+        """replay the recording"""
+        self.inject()
+        self.start_injecting = False
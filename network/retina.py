@@ -4,8 +4,18 @@
 # email: gvdikov93@gmail.com
 ###
 
+import numpy as np
 import os
 
+from backend import simulator as ps, external_devices, requires_spike_padding
+from binary_io import write_binary
+from pixel_spike_times import PixelSpikeTimes
+from injector_mapping import InjectorMapping
+
+# layout of the retina spikes in the binary output of Retina.get_spikes
+RETINA_SPIKES_DTYPE = np.dtype([('t', np.float64), ('x', np.int32), ('y', np.int32)])
+
+
 class Retina(object):
     def __init__(self, label="Retina", dimension_x=1, dimension_y=1,
                  use_prerecorded_input=True, spike_times=None,
@@ -14,28 +24,32 @@ class Retina(object):
         assert len(spike_times) >= dimension_x and len(spike_times[0]) >= dimension_y, \
             "ERROR: Dimensionality of retina's spiking times is bad. Retina initialization failed."
 
-        if min_disparity != 0:
-            print "WARNING: The minimum disparity is not 0. " \
-                  "This may lead to nonsensical results or failure as the network is not tested thoroughly."
+        # NOTE: min_disparity is kept for compatibility only. All pixel columns are created, also for a minimum
+        # disparity above 0, and the CooperativeNetwork leaves the ones without any microensemble unconnected.
 
         self.label = label
         self.experiment_name = experiment_name
         self.dim_x = dimension_x
         self.dim_y = dimension_y
         self.use_prerecorded_input = use_prerecorded_input
+        self.spike_times = spike_times
+        self.injector_mapping = None
 
         if verbose:
             print "INFO: Creating Spike Source: {0}".format(label)
 
-        import spynnaker.pyNN as ps
-
         self.pixel_columns = []
         self.labels = []
 
         if use_prerecorded_input or spike_times is not None:
-            for x in range(0, dimension_x - min_disparity):
+            for x in range(0, dimension_x):
                 retina_label = "{0}_{1}".format(label, x)
-                col_of_pixels = ps.Population(dimension_y, ps.SpikeSourceArray, {'spike_times': spike_times[x]},
+                # the columns of PixelSpikeTimes are handed over as array views, padded only if the backend needs it
+                if isinstance(spike_times, PixelSpikeTimes):
+                    column_spike_times = spike_times.column(x, pad=requires_spike_padding())
+                else:
+                    column_spike_times = spike_times[x]
+                col_of_pixels = ps.Population(dimension_y, ps.SpikeSourceArray, {'spike_times': column_spike_times},
                                                label=retina_label, structure=ps.Line())
 
                 self.pixel_columns.append(col_of_pixels)
@@ -44,34 +58,33 @@ class Retina(object):
                     col_of_pixels.record()
 
         else:
-            import spynnaker_external_devices_plugin.pyNN as sedp
-
-            # constants and variables for the live injector mode
+            # constants and variables for the live injector mode. The injector neurons are packed densely into the
+            # populations (since they are limited!), the same mapping is used by the DVSReader to address them
             init_portnum = 12000 if "l" in label.lower() else 13000
-            remaining_pixel_cols = dimension_x
-            MAX_INJNEURONS_IN_POPULATION = 255
-
-            for x in range(0, int((dimension_x-min_disparity-1)/(MAX_INJNEURONS_IN_POPULATION/dimension_y))+1):
-                retina_label = "{0}_{1}".format(label, x)
-
-                # some hacks to pack the injector neurons densely in the populations (since they are limited!)
-                if remaining_pixel_cols > int(MAX_INJNEURONS_IN_POPULATION / dimension_y):
-                    col_height = int(MAX_INJNEURONS_IN_POPULATION / dimension_y) * dimension_y
-                else:
-                    col_height = remaining_pixel_cols * dimension_y
+            self.injector_mapping = InjectorMapping(dim_x=dimension_x, dim_y=dimension_y)
 
+            for x, (retina_label, col_height) in enumerate(zip(self.injector_mapping.labels(label),
+                                                               self.injector_mapping.population_sizes)):
                 col_of_pixels = ps.Population(col_height,
-                                              sedp.SpikeInjector,
+                                              external_devices.SpikeInjector,
                                               {'port': init_portnum + x},
                                               label=retina_label)
-                remaining_pixel_cols -= int(MAX_INJNEURONS_IN_POPULATION / dimension_y)
 
                 self.pixel_columns.append(col_of_pixels)
                 self.labels.append(retina_label)
                 if record_spikes:
                     col_of_pixels.record()
 
-    def get_spikes(self, sort_by_time=True, save_spikes=True):
+    def load_time_slice(self, begin, end):
+        """replaces the spike times of the pixel columns with the ones within [begin, end) (for a segmented run, see
+        SNNSimulation.run_segmented). The spike times keep their absolute values."""
+        if not isinstance(self.spike_times, PixelSpikeTimes):
+            self.spike_times = PixelSpikeTimes.from_lists(self.spike_times)
+        time_slice = self.spike_times.select_times(begin, end)
+        for x, col_of_pixels in enumerate(self.pixel_columns):
+            col_of_pixels.set('spike_times', time_slice.column(x, pad=requires_spike_padding()))
+
+    def get_spikes(self, sort_by_time=True, save_spikes=True, file_format='text'):
         spikes_per_population = [x.getSpikes() for x in self.pixel_columns]
         spikes = list()
         for col_index, col in enumerate(spikes_per_population, 0):  # it is 0-indexed
@@ -86,16 +99,27 @@ class Retina(object):
             if not os.path.exists("./spikes"):
                 os.makedirs("./spikes")
             i = 0
-            while os.path.exists("./spikes/{0}_{1}_spikes_{2}.dat".format(self.experiment_name, i, self.label)):
+            extension = "bin" if file_format == 'binary' else "dat"
+            while os.path.exists("./spikes/{0}_{1}_spikes_{2}.{3}".format(self.experiment_name, i,
+                                                                          self.label, extension)):
                 i += 1
-            with open('./spikes/{0}_{1}_spikes_{2}.dat'.format(self.experiment_name, i, self.label), 'w') as fs:
-                fs.write("### DATA FORMAT ###\n"
-                        "# Description: These are the spikes a retina has produced (see file name for exact retina label).\n"
-                        "# Each row contains: "
-                        "Time stamp -- x-coordinate -- y-coordinate\n"
-                        "### DATA START ###\n")
-                for s in spikes:
-                    fs.write(str(s[0]) + " " + str(s[1]) + " " + str(s[2]) + "\n")
-                fs.write("### DATA END ###")
-                fs.close()
+            if file_format == 'binary':
+                write_binary('./spikes/{0}_{1}_spikes_{2}.bin'.format(self.experiment_name, i, self.label),
+                             np.array(spikes, dtype=RETINA_SPIKES_DTYPE),
+                             meta={'experiment_name': self.experiment_name,
+                                   'label': self.label,
+                                   'dim_x': self.dim_x,
+                                   'dim_y': self.dim_y,
+                                   'description': "These are the spikes a retina has produced."})
+            else:
+                with open('./spikes/{0}_{1}_spikes_{2}.dat'.format(self.experiment_name, i, self.label), 'w') as fs:
+                    fs.write("### DATA FORMAT ###\n"
+                            "# Description: These are the spikes a retina has produced (see file name for exact retina label).\n"
+                            "# Each row contains: "
+                            "Time stamp -- x-coordinate -- y-coordinate\n"
+                            "### DATA START ###\n")
+                    for s in spikes:
+                        fs.write(str(s[0]) + " " + str(s[1]) + " " + str(s[2]) + "\n")
+                    fs.write("### DATA END ###")
+                    fs.close()
         return spikes
@@ -4,23 +4,62 @@
 # email: gvdikov93@gmail.com
 ###
 
-import spynnaker.pyNN as ps
+from backend import simulator as ps, use_backend
+from binary_io import append_binary
 
 class SNNSimulation(object):
-    def __init__(self, simulation_time=1000, simulation_time_step=0.2, n_chips_required=48*6, threads_count=4):
+    def __init__(self, simulation_time=1000, simulation_time_step=0.2, n_chips_required=48*6, threads_count=4,
+                 backend='spinnaker', **backend_params):
         self.simulation_time = simulation_time
         self.time_step = simulation_time_step
-        # setup timestep of simulation and minimum and maximum synaptic delays
+        # the backend ('spinnaker' or the local 'cpu' reference simulator) is used by all Retinas and
+        # CooperativeNetworks which are created after this simulation
+        use_backend(backend)
+        # setup timestep of simulation and minimum and maximum synaptic delays. Any further keyword arguments are
+        # passed on to the backend (e.g. batch_size for the cpu backend)
         ps.setup(timestep=simulation_time_step,
                  min_delay=simulation_time_step,
                  max_delay=10*simulation_time_step,
                  n_chips_required = n_chips_required,
-                 threads=threads_count)
+                 threads=threads_count,
+                 **backend_params)
 
     def run(self):
         # run simulation for time in milliseconds
         ps.run(self.simulation_time)
 
+    def run_segmented(self, network, segment_duration=1000, spikes_file=None, on_segment=None):
+        """
+        Runs the simulation in consecutive slices of segment_duration ms. Before each slice the retinas of the
+        network get the input spikes of that slice only (see Retina.load_time_slice), and after it the collector
+        spikes are drained from the backend (see CooperativeNetwork.drain_spikes) and appended to the binary
+        spikes_file (see binary_io). With a backend which can drop its recordings (see backend.clear_recordings,
+        e.g. the cpu backend) the memory use thus does not grow with the length of the recording. The other
+        backends (e.g. spinnaker) keep all recorded spikes, which are then read again after each slice.
+        on_segment(spikes, begin, end) is called with the decoded spikes of each slice. Returns the number of spikes.
+        """
+        n_spikes = 0
+        # the slices are whole numbers of time steps, otherwise the rounding of each run would shift the slices
+        n_steps = int(round(self.simulation_time / self.time_step))
+        segment_steps = max(int(round(segment_duration / self.time_step)), 1)
+        for first_step in range(0, n_steps, segment_steps):
+            begin = first_step * self.time_step
+            end = min(first_step + segment_steps, n_steps) * self.time_step
+            # the spike times are rounded to the time step, so the slice boundaries are shifted by half a time step
+            for retina in (network.retinae['left'], network.retinae['right']):
+                retina.load_time_slice(begin - self.time_step / 2.0, end - self.time_step / 2.0)
+            ps.run(end - begin)
+            spikes = network.drain_spikes(since=begin)
+            if spikes_file is not None:
+                append_binary(spikes_file, spikes, meta={'preamble': network._preamble_data(),
+                                                         'description': "All spikes from the Collector Neurons. "
+                                                                        "The disparity is calculated with the left "
+                                                                        "camera as reference."})
+            if on_segment is not None:
+                on_segment(spikes, begin, end)
+            n_spikes += len(spikes)
+        return n_spikes
+
     def end(self):
         # finalise program and simulation
         ps.end()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import time
+from threading import Lock
+import numpy as np
+
+
+class StereoSynchroniser(object):
+    """
+    Merges the events of the left and the right DVSReader (or ReplayReader) by time before they are injected, such
+    that the left and right events of the same moment reach the network together. The readers hand over their
+    batches with the event times on the host clock (see DVSReader.timestamp_mode) and the events are released in
+    time order as soon as the other reader has delivered later events, or when they have been buffered for
+    max_delay seconds (so that a silent camera does not hold back the other one). If more than max_events are
+    buffered the oldest ones are released. Each release sends the events of a reader with one send_spikes call per
+    injector population.
+    stats holds the numbers of pushed and released events, of the ones released by the timeout or because the
+    buffer was full, the largest number of buffered events and, in seconds, the skew between the streams (the
+    difference of the times of the latest left and right events at each push, as sum of the absolute values over
+    skew_samples and maximum) and the latency of the released events (from their time to their release, as sum and
+    maximum).
+    """
+
+    def __init__(self, left, right, max_delay=0.005, max_events=4096):
+        self.readers = (left, right)
+        self.max_delay = max_delay
+        self.max_events = max_events
+        left.synchroniser = self
+        right.synchroniser = self
+
+        self._lock = Lock()
+        # the buffered injector population ids, neuron ids and times of each reader, and the time of its latest event
+        self._buffers = dict((reader, []) for reader in self.readers)
+        self._latest = dict((reader, None) for reader in self.readers)
+        self._closed = set()
+        self._n_buffered = 0
+        self.stats = dict((key, 0) for key in ('pushed', 'released', 'timeouts', 'overflows', 'max_buffered',
+                                               'skew_samples'))
+        self.stats.update({'skew': 0.0, 'max_skew': 0.0, 'latency': 0.0, 'max_latency': 0.0})
+
+    def empty(self):
+        return self._n_buffered == 0
+
+    def push(self, reader, injector_ids, neuron_ids, times):
+        """buffers a batch of events of one of the readers and releases the ones which are due."""
+        with self._lock:
+            self._buffers[reader].append((injector_ids, neuron_ids, times))
+            self._n_buffered += len(times)
+            self.stats['pushed'] += len(times)
+            if len(times):
+                latest = self._latest[reader]
+                self._latest[reader] = times.max() if latest is None else max(latest, times.max())
+            left, right = [self._latest[r] for r in self.readers]
+            if left is not None and right is not None:
+                skew = abs(left - right)
+                self.stats['skew'] += skew
+                self.stats['max_skew'] = max(self.stats['max_skew'], skew)
+                self.stats['skew_samples'] += 1
+            self.stats['max_buffered'] = max(self.stats['max_buffered'], self._n_buffered)
+            self._release(time.time())
+
+    def release(self):
+        """releases the buffered events which are due."""
+        if self._n_buffered > 0:
+            with self._lock:
+                self._release(time.time())
+
+    def close(self, reader):
+        """called by a reader which has stopped, such that it does not hold back the events of the other one."""
+        with self._lock:
+            self._closed.add(reader)
+            self._release(time.time())
+
+    def _release(self, now):
+        # the events up to the latest time which both (open) readers have reached are in order
+        latest = [self._latest[r] for r in self.readers if r not in self._closed]
+        if len(latest) == 0:
+            in_order = np.inf
+        elif None in latest:
+            in_order = -np.inf
+        else:
+            in_order = min(latest)
+        timeout = max(in_order, now - self.max_delay)
+        horizon = timeout
+        if self._n_buffered > self.max_events:
+            # release the oldest events beyond the capacity of the buffer
+            times = np.concatenate([t for buffered in self._buffers.values() for _, _, t in buffered])
+            horizon = max(horizon, np.partition(times, self._n_buffered - self.max_events - 1)[
+                self._n_buffered - self.max_events - 1])
+
+        for reader in self.readers:
+            if len(self._buffers[reader]) == 0:
+                continue
+            injector_ids, neuron_ids, times = [np.concatenate(a) for a in zip(*self._buffers[reader])]
+            due = times <= horizon
+            if not due.any():
+                self._buffers[reader] = [(injector_ids, neuron_ids, times)]
+                continue
+            order = np.argsort(times[due], kind='mergesort')
+            reader.flush([injector_ids[due][order]], [neuron_ids[due][order]])
+            released = times[due]
+            self._n_buffered -= len(released)
+            self.stats['released'] += len(released)
+            self.stats['timeouts'] += int(((released > in_order) & (released <= timeout)).sum())
+            self.stats['overflows'] += int((released > timeout).sum())
+            latency = now - released
+            self.stats['latency'] += float(latency.sum())
+            self.stats['max_latency'] = max(self.stats['max_latency'], float(latency.max()))
+            self._buffers[reader] = [(injector_ids[~due], neuron_ids[~due], times[~due])] if not due.all() else []
+
+    def print_statistics(self):
+        mean_skew = self.stats['skew'] / max(self.stats['skew_samples'], 1)
+        mean_latency = self.stats['latency'] / max(self.stats['released'], 1)
+        print("INFO: Stereo synchronisation: {0} events released ({1} by timeout, {2} by overflow, at most {3} "
+              "buffered), skew {4:.2f} ms on average, {5:.2f} ms at most, latency {6:.2f} ms on average, {7:.2f} ms "
+              "at most.".format(self.stats['released'], self.stats['timeouts'], self.stats['overflows'],
+                                self.stats['max_buffered'], 1000.0 * mean_skew, 1000.0 * self.stats['max_skew'],
+                                1000.0 * mean_latency, 1000.0 * self.stats['max_latency']))
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import threading
+import numpy as np
+
+# measures the throughput of the DVSReader without a camera: the event words are written into pyserial's loop://
+# port, from which the reader decodes them and sends them to a connection that only counts the spikes. The former
+# event by event loop (read(2) per event) is measured on the same port for comparison. The loop only buffers a few
+# kilobytes, so the words are written by a separate thread while they are being read.
+root = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, root)
+from network import DVSReader
+from network.live_dvs_reader import decode_event_words
+
+
+class CountingConnection(object):
+    """stands in for the live connection of the SpikeInjectors and counts the sent spikes and packets."""
+
+    def __init__(self):
+        self.n_spikes = 0
+        self.n_packets = 0
+
+    def send_spike(self, label, neuron_id, send_full_keys=False):
+        self.n_spikes += 1
+        self.n_packets += 1
+
+    def send_spikes(self, label, neuron_ids, send_full_keys=False):
+        self.n_spikes += len(neuron_ids)
+        self.n_packets += 1
+
+
+def event_words(n_events, seed=0):
+    """n_events random event words of the eDVS (without repeated pixels, which would be filtered as bursts)."""
+    rng = np.random.RandomState(seed)
+    x = rng.randint(0, 128, n_events)
+    y = rng.randint(0, 128, n_events)
+    p = rng.randint(0, 2, n_events)
+    words = np.empty(2 * n_events, dtype=np.uint8)
+    words[0::2] = 0x80 | x
+    words[1::2] = (p << 7) | y
+    return words.tostring()
+
+
+def feed(dvsdev, words):
+    writer = threading.Thread(target=dvsdev.write, args=(words,))
+    writer.setDaemon(True)
+    writer.start()
+    return writer
+
+
+def legacy_read(dvsdev, n_events):
+    """the former decoding of DVSReader.run, without the filtering and injection."""
+    n_decoded = 0
+    while n_decoded < n_events:
+        data = bytearray(dvsdev.read(2))
+        if (data[0] & 0x80) != 0:
+            x = data[0] & 0x7f
+            y = data[1] & 0x7f
+            p = data[1] >> 7
+            n_decoded += 1
+        else:
+            dvsdev.read(1)
+
+
+def legacy_decode(words):
+    """the former per byte decoding of a buffer which has been read completely."""
+    data = bytearray(words)
+    decoded = []
+    i = 0
+    while i + 1 < len(data):
+        if (data[i] & 0x80) != 0:
+            decoded.append((data[i] & 0x7f, data[i + 1] & 0x7f, data[i + 1] >> 7))
+            i += 2
+        else:
+            i += 1
+    return decoded
+
+
+if __name__ == "__main__":
+    n_events = 100000
+    words = event_words(n_events)
+
+    # the decoding alone, on a buffer in memory
+    start = time.time()
+    legacy_events = legacy_decode(words)
+    legacy_duration = time.time() - start
+    start = time.time()
+    x, y, p, _, _ = decode_event_words(bytearray(words))
+    duration = time.time() - start
+    assert zip(x.tolist(), y.tolist(), p.tolist()) == legacy_events, "ERROR: The decoded events differ."
+    print("decoding {0} events: per byte {1:.3f} s, vectorised {2:.4f} s, speedup {3:.0f}x".format(
+        n_events, legacy_duration, duration, legacy_duration / duration))
+
+    # the whole reader, on the loop:// port (which transfers the data byte by byte and thus limits the throughput)
+
+    reader = DVSReader(address='loop://', port='', dim_x=128, dim_y=128, crop_window=False, label="RetL",
+                       live_connection=CountingConnection())
+    # drop the commands of dvs_init, which the loop returns
+    reader.dvsdev.reset_input_buffer()
+
+    start = time.time()
+    feed(reader.dvsdev, words)
+    legacy_read(reader.dvsdev, n_events)
+    legacy_duration = time.time() - start
+
+    reader.start_injecting = True
+    feed(reader.dvsdev, words)
+    start = time.time()
+    reader.start()
+    while reader.stats['events'] < n_events:
+        time.sleep(0.001)
+    duration = time.time() - start
+    rates = reader.get_rates()
+    reader.stop = True
+    reader.join()
+
+    print("reading {0} events: event by event {1:.3f} s ({2:.0f} events/s), bulk {3:.3f} s ({4:.0f} events/s)".format(
+        n_events, legacy_duration, n_events / legacy_duration, duration, n_events / duration))
+    print("reads {reads}, bytes {bytes}, events {events}, skipped bytes {skipped_bytes}, filtered {filtered}, "
+          "sent {sent} in {packets} packets".format(**reader.stats))
+    print("injection: {0:.0f} events/s, {1:.0f} packets/s, {2:.1f} events per packet".format(
+        rates['events'], rates['packets'], reader.stats['sent'] / float(max(reader.stats['packets'], 1))))
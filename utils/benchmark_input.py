@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import numpy as np
+
+# compares the vectorised ExternalInputReader with the former event by event loop on the pendulum recording
+root = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, root)
+from network import ExternalInputReader
+
+path_to_input = os.path.join(root, "data/input/pendulum_left_30cm_2.tsv.npz")
+
+
+def legacy_read_npz(file_path, crop_xmin, crop_ymin, crop_xmax, crop_ymax, dim_x, dim_y, sim_time):
+    """the former implementation of ExternalInputReader for .npz files with the time in microseconds."""
+    f = np.load(file_path)
+    eventList = []
+    for t, x, y, p in f["left"]:
+        if t > sim_time * 1000:
+            break
+        eventList.append([float(t), int(x), int(y), int(p), 1])
+    for t, x, y, p in f["right"]:
+        if t > sim_time * 1000:
+            break
+        eventList.append([float(t), int(x), int(y), int(p), 0])
+
+    max_time = sim_time
+    retinaL = [[[] for y in range(dim_y)] for x in range(dim_x)]
+    retinaR = [[[] for y in range(dim_y)] for x in range(dim_x)]
+    last_tL = [[-1.0] * dim_y for x in range(dim_x)]
+    last_tR = [[-1.0] * dim_y for x in range(dim_x)]
+    last_tL[0][0] = last_tR[0][0] = 0.0
+    for evt in eventList:
+        x = evt[1] - 1
+        y = evt[2] - 1
+        t = evt[0] / 1000.0
+        if crop_xmin <= x < crop_xmax and crop_ymin <= y < crop_ymax:
+            retina, last_t = (retinaR, last_tR) if evt[4] == 1 else (retinaL, last_tL)
+            if t - last_t[x - crop_xmin][y - crop_ymin] >= 1.0 and t <= max_time:
+                retina[x - crop_xmin][y - crop_ymin].append(t)
+                last_t[x - crop_xmin][y - crop_ymin] = t
+    for x in range(0, dim_x):
+        for y in range(0, dim_y):
+            if retinaR[x][y] == []:
+                retinaR[x][y].append(max_time + 10)
+            if retinaL[x][y] == []:
+                retinaL[x][y].append(max_time + 10)
+    return retinaL, retinaR
+
+
+if __name__ == "__main__":
+    for dim, crop_min, sim_time in ((40, 32, 10000), (128, 0, 14000)):
+        params = {'crop_xmin': crop_min, 'crop_ymin': crop_min, 'crop_xmax': crop_min + dim,
+                  'crop_ymax': crop_min + dim, 'dim_x': dim, 'dim_y': dim, 'sim_time': sim_time}
+
+        start = time.time()
+        retinaL, retinaR = legacy_read_npz(path_to_input, **params)
+        legacy_duration = time.time() - start
+
+        start = time.time()
+        reader = ExternalInputReader(file_path=path_to_input, **params)
+        duration = time.time() - start
+
+        assert reader.retinaLeft.to_lists() == retinaL and reader.retinaRight.to_lists() == retinaR, \
+            "ERROR: The vectorised reader does not produce the same spike times."
+        print("{0}x{0} pixels, {1} ms: loop {2:.3f} s, vectorised {3:.3f} s, speedup {4:.1f}x".format(
+            dim, sim_time, legacy_duration, duration, legacy_duration / duration))
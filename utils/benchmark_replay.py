@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+# replays a recording through the live injection path (see ReplayReader) into a local connection which stands in
+# for the SpiNNaker live spikes connection, and reports the throughput and the latency of each retina. The replay is
+# repeatable, so that the spikes received in two runs (e.g. before and after a change of the reader) can be compared.
+# With a sync delay (in ms) the left and right events are merged by time (see StereoSynchroniser), whose skew and
+# latency are reported as well.
+# usage: python benchmark_replay.py <recording> [speed (default 1.0, 0 for as fast as possible)] [dim_x] [dim_y]
+#                                   [sync delay]
+root = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, root)
+from network.replay_reader import ReplayReader, LocalLiveSpikesConnection
+from network.stereo_sync import StereoSynchroniser
+
+
+def replay(source, speed=1.0, dim_x=128, dim_y=128, record=False, sync_delay=None):
+    """replays both retinas of the recording and returns the readers, the connection and the synchroniser."""
+    connection = LocalLiveSpikesConnection(record=record)
+    readers = [ReplayReader(source, retina=retina, label=label, dim_x=dim_x, dim_y=dim_y, speed=speed,
+                            live_connection=connection)
+               for retina, label in enumerate(("RetL", "RetR"))]
+    synchroniser = StereoSynchroniser(*readers, max_delay=sync_delay) if sync_delay is not None else None
+    for reader in readers:
+        connection.add_start_callback(reader.label, lambda reader=reader: setattr(reader, 'start_injecting', True))
+        reader.start()
+    connection.start()
+    for reader in readers:
+        while reader.is_alive():
+            reader.join(0.1)
+    return readers, connection, synchroniser
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root, "data", "input", "NSTlogo_disp12-8-3.dat")
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    dim_x = int(sys.argv[3]) if len(sys.argv) > 3 else 128
+    dim_y = int(sys.argv[4]) if len(sys.argv) > 4 else dim_x
+    sync_delay = float(sys.argv[5]) / 1000.0 if len(sys.argv) > 5 else None
+
+    start = time.time()
+    readers, connection, synchroniser = replay(source, speed=speed if speed > 0 else None, dim_x=dim_x, dim_y=dim_y,
+                                               sync_delay=sync_delay)
+    duration = time.time() - start
+    for reader in readers:
+        reader.print_statistics()
+    if synchroniser is not None:
+        synchroniser.print_statistics()
+    print("INFO: {0} spikes received in {1} packets within {2:.3f} s ({3:.0f} spikes/s).".format(
+        connection.n_spikes, connection.n_packets, duration, connection.n_spikes / duration))
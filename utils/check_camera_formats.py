@@ -0,0 +1,107 @@
+import os
+import sys
+import shutil
+import struct
+import tempfile
+import numpy as np
+
+# checks the decoders of camera_formats on small synthetic recordings: the events are encoded into AEDAT 2.0 (with
+# the conventions of jAER's DVS128 extractor and a wrap around of the timestamps), stereo AEDAT 3.1 (with
+# overlapping packets of two sources) and EVT 2.0 (with a wrap around of the EVT_TIME_HIGH counter) and decoded
+# again, at once, block by block, in chunks (see event_io.iter_events) and through the ExternalInputReader.
+# usage: python check_camera_formats.py
+root = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, root)
+from network import ExternalInputReader
+from network.camera_formats import read_camera, camera_streams, aedat2_blocks, DVS128_WIDTH
+from network.event_io import iter_events
+
+
+def synthetic_events(n_events, retinas=(0,), t_begin=0, seed=0):
+    """(t, x, y, p, retina) rows with distinct timestamps (in us) and 1-based coordinates on a DVS128."""
+    rng = np.random.RandomState(seed)
+    t = t_begin + np.sort(rng.choice(10 * n_events, n_events, replace=False)) * 300
+    return np.column_stack((t, rng.randint(1, 129, n_events), rng.randint(1, 129, n_events),
+                            rng.randint(0, 2, n_events), rng.choice(retinas, n_events))).astype(np.int64)
+
+
+def write_aedat2(file_path, events):
+    # jAER's DVS128 address: OFF in bit 0, mirrored x in the bits 1-7, y in the bits 8-14, the retina in bit 15
+    x = DVS128_WIDTH - events[:, 1]
+    address = (1 - events[:, 3]) | (x << 1) | ((events[:, 2] - 1) << 8) | (events[:, 4] << 15)
+    words = np.column_stack((address, events[:, 0] & 0xffffffff)).astype('>u4')
+    with open(file_path, 'wb') as f:
+        f.write(b"#!AER-DAT2.0\r\n# This is a raw AE data file\r\n#End Of ASCII Header\r\n" + words.tostring())
+
+
+def write_aedat3(file_path, events, packet_events=64):
+    # the packets of the sources 1 (retina 0) and 2 (retina 1) alternate, so that they overlap in time
+    packets = []
+    for retina in (0, 1):
+        selected = events[events[:, 4] == retina]
+        for i in range(0, len(selected), packet_events):
+            packet = selected[i:i + packet_events]
+            words = np.column_stack((1 | (packet[:, 3] << 1) | ((packet[:, 2] - 1) << 2) | ((packet[:, 1] - 1) << 17),
+                                     packet[:, 0] & 0x7fffffff)).astype('<u4')
+            packets.append((i, retina, struct.pack('<hhiiiiii', 1, retina + 1, 8, 4, int(packet[0, 0] >> 31),
+                                                   len(packet), len(packet), len(packet)) + words.tostring()))
+    with open(file_path, 'wb') as f:
+        f.write(b"#!AER-DAT3.1\r\n#Format: RAW\r\n#!END-HEADER\r\n")
+        for _, _, packet in sorted(packets):
+            f.write(packet)
+
+
+def write_evt2(file_path, events):
+    words, time_high = [], None
+    for t, x, y, p, _ in events:
+        if (t >> 6) & 0x0fffffff != time_high:
+            time_high = (t >> 6) & 0x0fffffff
+            words.append((0x8 << 28) | time_high)
+        words.append((p << 28) | ((t & 0x3f) << 22) | ((x - 1) << 11) | (y - 1))
+    with open(file_path, 'wb') as f:
+        f.write(b"% evt 2.0\n% end\n" + np.array(words, dtype='<u4').tostring())
+
+
+def check(condition, message):
+    assert condition, "ERROR: " + message
+    print("INFO: " + message)
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    try:
+        # AEDAT 2.0, beginning shortly before the 32 bit timestamps wrap around
+        events = synthetic_events(3000, retinas=(0, 1), t_begin=(1 << 32) - 400000)
+        write_aedat2(os.path.join(directory, "stereo2.aedat"), events)
+        decoded = read_camera(os.path.join(directory, "stereo2.aedat"))
+        check((decoded == events).all(), "AEDAT 2.0 events decoded as jAER, across the timestamp wrap around.")
+        with open(os.path.join(directory, "stereo2.aedat"), 'rb') as f:
+            blocks = list(aedat2_blocks(f.read(), block_rows=97))
+        check((np.concatenate(blocks) == events).all(), "AEDAT 2.0 events decoded block by block.")
+
+        # AEDAT 3.1 with two sources, whose packets overlap in time
+        events = synthetic_events(3000, retinas=(0, 1), seed=1)
+        file_path = os.path.join(directory, "stereo3.aedat")
+        write_aedat3(file_path, events)
+        decoder_params = {'source_retinas': {1: 0, 2: 1}}
+        check((read_camera(file_path, **decoder_params) == events).all(), "AEDAT 3.1 events of two sources decoded.")
+        check(len(camera_streams(file_path, **decoder_params)) == 2, "AEDAT 3.1 sources decoded as separate streams.")
+        chunks = list(iter_events(file_path, chunk_size=50, decoder_params=decoder_params))
+        check(all(len(chunk) <= 50 for chunk in chunks) and (np.concatenate(chunks) == events).all(),
+              "AEDAT 3.1 events of two sources merged by time in chunks.")
+        parameters = dict(file_path=file_path, dim_x=128, dim_y=128, sim_time=400, decoder_params=decoder_params)
+        at_once, chunked = ExternalInputReader(**parameters), ExternalInputReader(chunk_size=50, **parameters)
+        check(at_once.retinaRight.to_lists() == chunked.retinaRight.to_lists() and
+              at_once.retinaLeft.to_lists() == chunked.retinaLeft.to_lists() and
+              at_once.statistics['right']['accepted'] > 0,
+              "AEDAT 3.1 stereo recording read at once and in chunks alike.")
+
+        # EVT 2.0, beginning shortly before the 28 bit EVT_TIME_HIGH counter wraps around
+        events = synthetic_events(3000, t_begin=(1 << 34) - 400000, seed=2)
+        file_path = os.path.join(directory, "mono.raw")
+        write_evt2(file_path, events)
+        check((read_camera(file_path) == events).all(), "EVT 2.0 events decoded across the timestamp wrap around.")
+        blocks = [block for stream in camera_streams(file_path, block_rows=97) for block in stream]
+        check((np.concatenate(blocks) == events).all(), "EVT 2.0 events decoded block by block.")
+    finally:
+        shutil.rmtree(directory)
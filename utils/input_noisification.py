@@ -1,7 +1,11 @@
+import os
+import sys
 import numpy as np
 
-with open('../data/input/NSTlogo_disp12-8-3_1s.dat', 'r') as f:
-    events = np.asarray([map(int, x.split()) for x in f.readlines()], dtype=np.int32)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from network.event_io import parse_dat_file
+
+events = parse_dat_file('../data/input/NSTlogo_disp12-8-3_1s.dat')
 
 # get left and right events in space and time
 left_bit = 0
@@ -11,48 +11,24 @@ class InputAnalyser(object):
 
         self.input_file = input_file
         self.input_file2 = input_file2
-        self.events = []
+        # the events as (t, x, y, p, retina) rows within [sim_time_begin, sim_time_end) (in ms). The window is
+        # found by binary search, so that only the events within it are read (see network.event_io)
+        from network.event_io import read_dat, read_npz
+        begin, end = sim_time_begin * 1000, sim_time_end * 1000
+        self.events = np.zeros((0, 5), dtype=np.int64)
 
-        if input_file[-4:] == ".dat":
-            with open(input_file, 'r') as file:
-                rawdata = file.read()
-            # read the file line by line and extract the timestamp, x and y coordinates, polarity and retina ID.
-            for e in rawdata.split('\n'):
-                if e != '':
-                    evt = [int(float(x)) for x in e.split()]
-                    if sim_time_begin*1000 <= evt[0] < sim_time_end * 1000:
-                        self.events.append(evt)
-                    elif evt[0] > sim_time_end * 1000:
-                        break
+        if input_file.endswith((".dat", ".dat.gz")):
+            self.events = read_dat(input_file, begin, end)
 
-        if input_file2[-4:] == ".dat":
-            with open(input_file2, 'r') as file:
-                rawdata = file.read()
-            for e in rawdata.split('\n'):
-                if e != '':
-                    evt = [int(float(x)) for x in e.split()]
-                    if sim_time_begin*1000 <= evt[0] < sim_time_end * 1000:
-                        self.events.append(evt)
-                    elif evt[0] > sim_time_end * 1000:
-                        break
+        if input_file2.endswith((".dat", ".dat.gz")):
+            self.events = np.concatenate((self.events, read_dat(input_file2, begin, end)))
         elif input_file[-4:] == ".npz":
-            from numpy import load as load_npz_file
-            f = load_npz_file(input_file)
-            data_left = f["left"]
-            data_right = f["right"]
-            for t, x, y, p in data_left:
-                if sim_time_begin*1000 <= t < sim_time_end * 1000:
-                    self.events.append((int(t), int(x), int(y), int(p), 1))
-                elif t > sim_time_end * 1000:
-                    break
-            evt_count_left = len(self.events)
-            print("Left num events: ", len(self.events))
-            for t, x, y, p in data_right:
-                if sim_time_begin*1000 <= t < sim_time_end * 1000:
-                    self.events.append((int(t), int(x), int(y), int(p), 0))
-                elif t > sim_time_end * 1000:
-                    break
-            print("Left num events: ", len(self.events)-evt_count_left)
+            data = read_npz(input_file, keys=("left", "right"), begin=begin, end=end)
+            events_left = np.column_stack((data["left"], np.ones(len(data["left"]), dtype=np.int64)))
+            print("Left num events: ", len(events_left))
+            events_right = np.column_stack((data["right"], np.zeros(len(data["right"]), dtype=np.int64)))
+            print("Right num events: ", len(events_right))
+            self.events = np.concatenate((events_left, events_right)).astype(np.int64)
 
     def input_density(self):
         self.events = np.asarray(self.events)
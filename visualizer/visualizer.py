@@ -18,6 +18,7 @@ class Visualizer(object):
                  network_dimensions=None,
                  spikes_file="",
                  membrane_potential_file="",
+                 microensemble=None,
                  verbose=False):
         self.experiment_name = experiment_name.replace(" ", "_")
         self.network_dimensions = network_dimensions
@@ -26,7 +27,11 @@ class Visualizer(object):
         self.network_voltage_file = membrane_potential_file
         self.spikes = []
 
-        if spikes_file:
+        if spikes_file.endswith(".bin"):
+            # the binary output is memory-mapped, i.e. only the parts which are being plotted are read from disk
+            from network.binary_io import read_binary
+            self.spikes, _ = read_binary(self.network_spikes_file)
+        elif spikes_file:
             with open(self.network_spikes_file, 'rb') as events:
                 is_data = False
                 for line in events:
@@ -43,10 +48,54 @@ class Visualizer(object):
             print("WARNING: Network spikes output file is not set. No spike data to visualize.")
         # self.spikes = np.asarray(self.spikes)
 
+        # the network reports the disparities of pooled retinas in sensor pixels, the plots work with the
+        # disparities of the microensembles
+        pool_size = network_dimensions.get('pool_size', 1) if network_dimensions is not None else 1
+        if pool_size != 1 and len(self.spikes):
+            if isinstance(self.spikes, list):
+                self.spikes = [(t, x, y, d // pool_size) for t, x, y, d in self.spikes]
+            else:
+                self.spikes = np.array(self.spikes)
+                self.spikes['disparity'] //= pool_size
+
         self.membrane_potential = {"bl": [], "br": [], "c": []}
 
-        # NOTE: it is assumed that if the membrane potential is to be ploted, then only one microensemble is recorded
-        if membrane_potential_file:
+        # NOTE: if no microensemble (x, y, disparity) is given, it is assumed that only one microensemble is recorded.
+        # Otherwise the population and neuron ids are resolved through the ensemble index of the network.
+        selected = None
+        if microensemble is not None:
+            from network.ensemble_index import EnsembleIndex
+            x, y, disparity = microensemble
+            disparity //= network_dimensions.get('pool_size', 1)
+            ensemble_index = EnsembleIndex(dim_x=network_dimensions['dim_x'],
+                                           max_disparity=network_dimensions['max_d'],
+                                           min_disparity=network_dimensions['min_d'],
+                                           ensemble_mask=network_dimensions.get('ensemble_mask'))
+            pop_id = ensemble_index.ensemble_id(x - 1, disparity)     # pixel coordinates are 1-indexed
+            assert pop_id >= 0, "ERROR: There is no microensemble for pixel {0} and disparity {1}.".format(x, disparity)
+            selected = (str(pop_id), str(y - 1), str(y - 1 + network_dimensions['dim_y']))
+
+        if membrane_potential_file.endswith(".bin"):
+            from network.binary_io import read_binary
+            records, meta = read_binary(self.network_voltage_file)
+            blocker_offsets, collector_offsets = meta['offsets']['b'], meta['offsets']['c']
+            if selected is not None:
+                # slice only the records of the selected populations, the rest is never paged in
+                pop_id, y = int(selected[0]), int(selected[1])
+                blockers = records[blocker_offsets[pop_id]:blocker_offsets[pop_id + 1]]
+                collectors = records[collector_offsets[pop_id]:collector_offsets[pop_id + 1]]
+                blockers_left = blockers[blockers['neuron'] == y]
+                blockers_right = blockers[blockers['neuron'] == y + network_dimensions['dim_y']]
+                collectors = collectors[collectors['neuron'] == y]
+            else:
+                blockers = records[:blocker_offsets[-1]]
+                blockers_left = blockers[blockers['neuron'] == 0]
+                blockers_right = blockers[blockers['neuron'] != 0]
+                collectors = records[collector_offsets[0]:]
+            self.membrane_potential["bl"] = np.column_stack((blockers_left['t'], blockers_left['v']))
+            self.membrane_potential["br"] = np.column_stack((blockers_right['t'], blockers_right['v']))
+            self.membrane_potential["c"] = np.column_stack((collectors['t'], collectors['v']))
+        elif membrane_potential_file:
             with open(self.network_voltage_file, 'rb') as voltages:
                 is_data = False
                 for line in voltages:
@@ -56,7 +105,17 @@ class Visualizer(object):
                             continue
                         else:
                             l = line.split()
-                            if l[0] == 'b':
+                            if selected is not None:
+                                if l[1] != selected[0] or l[2] not in selected[1:]:
+                                    continue
+                                if l[0] == 'b':
+                                    if l[2] == selected[1]:
+                                        self.membrane_potential["bl"].append((float(l[3]), float(l[4])))
+                                    else:
+                                        self.membrane_potential["br"].append((float(l[3]), float(l[4])))
+                                elif l[2] == selected[1]:
+                                    self.membrane_potential["c"].append((float(l[3]), float(l[4])))
+                            elif l[0] == 'b':
                                 if l[2] == '0':
                                     self.membrane_potential["bl"].append((float(l[3]), float(l[4])))
                                 else:
@@ -112,7 +171,10 @@ class Visualizer(object):
             plt.bar(range(0, self.network_dimensions['max_d'] - self.network_dimensions['min_d'] + 1),
                     spikes_per_disparity, align='center')
         else:
-            disps = [x[3] for x in self.spikes]
+            if isinstance(self.spikes, np.ndarray):
+                disps = self.spikes['disparity']
+            else:
+                disps = [x[3] for x in self.spikes]
 
             x = range(0, len(disps))
             y = disps
@@ -146,7 +208,8 @@ class Visualizer(object):
             plt.savefig("./figures/{0}_{1}.png".format(self.experiment_name, i))
 
 
-        return [disps.count(c) for c in range(self.network_dimensions['min_d'], self.network_dimensions['max_d'])]
+        counts = np.bincount(np.asarray(disps, dtype=np.int64), minlength=self.network_dimensions['max_d'] + 1)
+        return [int(counts[c]) for c in range(self.network_dimensions['min_d'], self.network_dimensions['max_d'])]
 
     def scatter_animation(self, dimension=3, save_animation=True, show_interactive=False, rotate=False):
 
@@ -246,16 +309,26 @@ class _Scatter(object):
         if self.scatter_plot is not None:
             self.scatter_plot.remove()
 
-        # reimplement in a more clever way so that movie generation is in total O(n) not O(nm)
-        current_frame = []
-        for s in self.visualizer.spikes:
-            if s[0] > self.window_end:
+        spikes = self.visualizer.spikes
+        if isinstance(spikes, np.ndarray):
+            # the spikes are sorted by time, so the frame is found by binary search and only it is paged in
+            begin, end = np.searchsorted(spikes['t'], [self.window_start, self.window_end], side='right')
+            current_frame = np.column_stack((spikes['x'][begin:end], spikes['y'][begin:end],
+                                             spikes['disparity'][begin:end]))
+            if end < len(spikes):
                 self.window_start += self.window_step
                 self.window_end = self.window_start + self.window_size
-                break
-            if s[0] > self.window_start:
-                current_frame.append((s[1], s[2], s[3]))
-        current_frame = np.asarray(current_frame)
+        else:
+            # reimplement in a more clever way so that movie generation is in total O(n) not O(nm)
+            current_frame = []
+            for s in spikes:
+                if s[0] > self.window_end:
+                    self.window_start += self.window_step
+                    self.window_end = self.window_start + self.window_size
+                    break
+                if s[0] > self.window_start:
+                    current_frame.append((s[1], s[2], s[3]))
+            current_frame = np.asarray(current_frame)
 
         if current_frame.size > 0:
 